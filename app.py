@@ -1,17 +1,19 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from passlib.hash import pbkdf2_sha256
 from datetime import datetime, timedelta, date
 from io import BytesIO
 
-from reportlab.lib.pagesizes import A6
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-
 from db import (
-    init_db, get_conn, ensure_default_users,
-    last_year_total_for, totals, group_totals_by
+    init_db, get_conn, ensure_default_users, WRITE_TIMEOUT_S,
+    totals, group_totals_by, quota_usage, quota_status,
+    issue_scrap, import_personnel, QuotaExceeded, DuplicateFormSerial,
+    evaluate_quota, list_quota_rules, save_quota_rules, QUOTA_PERIODS
+)
+from receipts import receipt_for_id, batch_receipts_pdf, BATCH_MAX_PAGES
+from auth import (
+    hash_it, authenticate, register_user, reset_password,
+    issue_session_token, resume_session, revoke_session
 )
 
 APP_TITLE = "LC Waikiki - Hurda Koli Takip Sistemi"
@@ -20,9 +22,6 @@ PRIMARY_RED  = "#E11D2E"
 ACCENT_YELLOW = "#FFD54F"
 BROWN = "#4b3b2b"
 
-MAX_ONCE = 15
-MAX_YEAR = 45
-
 # Kullanıcı adı -> Vardiya Amiri adı eşlemesi
 USERNAME_TO_LEADER = {
     "mesut.ozel": "Mesut Özel",
@@ -78,151 +77,31 @@ div[data-testid="stDataEditor"] div[role="grid"] {{ overflow:auto !important; }}
 """
 
 # ---------- yardımcılar
-def hash_it(s: str) -> str:
-    return pbkdf2_sha256.hash(s)
-
-def verify_it(pw: str, hashed: str) -> bool:
-    return pbkdf2_sha256.verify(pw, hashed)
-
 def normalize_date(d) -> date:
     if isinstance(d, tuple) and len(d) >= 1:
         return d[0]
     return d
 
-def authenticate(username, password, role_choice):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username=?", (username,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return False, "Kullanıcı bulunamadı."
-    if row["role"] != role_choice:
-        return False, "Rol uyuşmuyor. Doğru giriş tipini seçin."
-    if not verify_it(password, row["password_hash"]):
-        return False, "Şifre hatalı."
-    return True, {"id": row["id"], "username": row["username"], "role": row["role"]}
-
-def register_user(username, password, role_choice):
-    if len(username) < 3 or len(password) < 6:
-        return False, "Kullanıcı adı ≥3, şifre ≥6 karakter olmalı."
-    try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("INSERT INTO users(username, password_hash, role) VALUES(?,?,?)",
-                    (username, hash_it(password), role_choice))
-        conn.commit()
-        conn.close()
-        return True, "Kayıt başarılı."
-    except Exception as e:
-        return False, f"Kayıt alınamadı: {e}"
-
-def reset_password(username):
-    temp = "Sifirla_" + datetime.now().strftime("%H%M%S")
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username=?", (username,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return False, "Kullanıcı bulunamadı."
-    cur.execute("UPDATE users SET password_hash=? WHERE id=?", (hash_it(temp), row["id"]))
-    conn.commit(); conn.close()
-    return True, f"Geçici şifre: {temp}"
-
-def upsert_person_minimal(harmony_ref, vardiya_amiri, depo):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT OR IGNORE INTO personnel(harmony_ref, adi, soyadi, ad_soyad, vardiya_amiri, depo)
-        VALUES(?,?,?,?,?,?)
-    """, (harmony_ref, "", "", "", vardiya_amiri, depo))
-    if cur.rowcount == 0:
-        cur.execute("UPDATE personnel SET vardiya_amiri=?, depo=? WHERE harmony_ref=?",
-                    (vardiya_amiri, depo, harmony_ref))
-    conn.commit(); conn.close()
-
-def record_scrap(harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO scrap_records(harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial)
-        VALUES (?,?,?,?,?)
-    """,(harmony_ref, int(koli_sayisi), vardiya_amiri, depo, form_serial))
-    last_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return last_id
-
-def monthly_total_for(harmony_ref: str) -> int:
-    conn = get_conn()
-    cur = conn.cursor()
-    start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    cur.execute("""
-        SELECT COALESCE(SUM(koli_sayisi),0) AS total
-        FROM scrap_records
-        WHERE harmony_ref=? AND created_at >= ? AND strftime('%Y-%m', created_at)=?
-    """, (harmony_ref, start.strftime("%Y-%m-%d %H:%M:%S"), datetime.now().strftime("%Y-%m")))
-    row = cur.fetchone()
-    conn.close()
-    return int(row["total"] if row and row["total"] is not None else 0)
-
-def yearly_total_excluding(harmony_ref: str, exclude_id: int) -> int:
-    conn = get_conn()
-    cur = conn.cursor()
-    since = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d %H:%M:%S")
-    cur.execute("""
-        SELECT COALESCE(SUM(koli_sayisi),0) AS total
-        FROM scrap_records
-        WHERE harmony_ref=? AND created_at >= ? AND id != ?
-    """, (harmony_ref, since, exclude_id))
-    row = cur.fetchone()
-    conn.close()
-    return int(row["total"] if row and row["total"] is not None else 0)
-
-def make_receipt_pdf(record: dict) -> bytes:
-    buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A6)
-    width, height = A6
-    margin = 8 * mm
-    y = height - margin
-
-    c.setFillColorRGB(0.12, 0.35, 1.0)
-    c.rect(0, height-18*mm, width, 18*mm, fill=1, stroke=0)
-    c.setFillColorRGB(1,1,1)
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(margin, height-12*mm, "LC Waikiki - Hurda Koli Fişi")
-
-    y -= 10 * mm
-    c.setFillColorRGB(0, 0, 0)
-    c.setFont("Helvetica", 10)
-    lines = [
-        ("Form Seri No", record["form_serial"]),
-        ("Tarih", record["created_at"]),
-        ("Harmony Ref", record["harmony_ref"]),
-        ("Koli Sayısı", str(record["koli_sayisi"])),
-        ("Vardiya Amiri", record["vardiya_amiri"]),
-        ("Depo", record["depo"]),
-        ("Kaydı Giren", record.get("created_by","-")),
-    ]
-    for label, value in lines:
-        c.drawString(margin, y, f"{label}: {value}")
-        y -= 6 * mm
-
-    c.setFont("Helvetica-Oblique", 9)
-    c.drawString(margin, y, "Bu fiş sistem tarafından otomatik üretilmiştir.")
-    c.showPage()
-    c.save()
-    pdf = buf.getvalue()
-    buf.close()
-    return pdf
-
 # ---------- APP ----------
 st.set_page_config(page_title=APP_TITLE, page_icon="📦", layout="wide")
 st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
-init_db()
-ensure_default_users(hash_it)
+@st.cache_resource
+def bootstrap_db():
+    # Şema/varsayılan kayıtlar süreç başına bir kez; her rerun'da yazma ve hash maliyeti olmasın
+    init_db()
+    ensure_default_users(hash_it)
+    return True
+
+bootstrap_db()
+
+# Limit raporu tüm kişi x kural hesaplar; filtre başına kısa süre önbellekte tutulur,
+# eşik / "sadece sınıra yakın" değişiklikleri sorgu çalıştırmaz
+QUOTA_REPORT_TTL_S = 60
+
+@st.cache_data(ttl=QUOTA_REPORT_TTL_S, show_spinner="Limit raporu hesaplanıyor...")
+def cached_quota_usage(leaders: tuple, depos: tuple):
+    return quota_usage(list(leaders), list(depos))
 
 # Header
 st.markdown(f"""
@@ -237,6 +116,15 @@ st.markdown(f"""
 st.write("")
 
 # ---------- GİRİŞ ----------
+# Sayfa yenilendiğinde URL'deki imzalı jetonla şifre doğrulamadan oturuma devam et
+if "user" not in st.session_state and st.query_params.get("s"):
+    resumed = resume_session(st.query_params["s"])
+    if resumed:
+        st.session_state.user = resumed
+        st.session_state.session_token = st.query_params["s"]
+    else:
+        del st.query_params["s"]
+
 if "user" not in st.session_state:
     with st.container(border=True):
         st.subheader("Giriş")
@@ -257,6 +145,9 @@ if "user" not in st.session_state:
                 ok, res = authenticate(username.strip(), password, role_choice)
                 if ok:
                     st.session_state.user = res
+                    token = issue_session_token(res)
+                    if token:
+                        st.session_state.session_token = token
                     st.rerun()
                 else:
                     st.error(res)
@@ -276,14 +167,21 @@ if "user" not in st.session_state:
                     (st.success if ok else st.error)(msg)
     st.stop()
 
+# Jeton URL'ye girişten sonraki çalıştırmada yazılır: st.rerun, henüz gönderilmemiş sorgu
+# parametresi mesajını düşürebilir (yük altında jeton URL'ye hiç ulaşmıyordu)
+if st.session_state.get("session_token") and st.query_params.get("s") != st.session_state.session_token:
+    st.query_params["s"] = st.session_state.session_token
+
 # ---------- Sidebar ----------
 role = st.session_state.user["role"]
-menu_items = ["Kayıtlar"] if role != "admin" else ["Dashboard","Koli Ver","Personeller","Kayıtlar","Excel Yükle","Raporlar","İstatistikler"]
+menu_items = ["Kayıtlar"] if role != "admin" else ["Dashboard","Koli Ver","Personeller","Kayıtlar","Excel Yükle","Raporlar","Limit Raporu","Limit Kuralları","İstatistikler"]
 st.sidebar.title("Menü")
 page = st.sidebar.radio("Modüller", menu_items, index=0)
 st.sidebar.info(f"Giriş: **{st.session_state.user['username']}** ({'Yetkili' if role=='admin' else 'Güvenlik'})")
 if st.sidebar.button("Çıkış"):
-    st.session_state.clear(); st.rerun()
+    # Jeton sunucu tarafında iptal edilir; URL geçmişten açılsa da oturum devam etmez
+    revoke_session(st.session_state.get("session_token"))
+    st.session_state.clear(); st.query_params.clear(); st.rerun()
 
 # ---------- SAYFALAR ----------
 if page == "Dashboard":
@@ -347,21 +245,17 @@ elif page == "Koli Ver":
 
     # Özet kutuları için Harmony Ref
     hr = st.text_input("Harmony Ref *", key="hr_input", placeholder="Örn: HRM123456").strip()
+    once_limit = None
     if hr:
-        used_year = last_year_total_for(hr)
-        conn = get_conn(); cur = conn.cursor()
-        start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        cur.execute("""
-            SELECT COALESCE(SUM(koli_sayisi),0) AS total
-            FROM scrap_records
-            WHERE harmony_ref=? AND created_at >= ? AND strftime('%Y-%m', created_at)=?
-        """, (hr, start.strftime("%Y-%m-%d %H:%M:%S"), datetime.now().strftime("%Y-%m")))
-        used_month = int((cur.fetchone() or {"total":0})["total"]); conn.close()
-        left = max(0, MAX_YEAR - used_year)
-        c1, c2, c3 = st.columns(3)
-        c1.markdown(f'<div class="info-card">Bu Ay<br><span class="big">{used_month}</span> koli</div>', unsafe_allow_html=True)
-        c2.markdown(f'<div class="info-card">Son 365 Gün<br><span class="big">{used_year}</span> koli</div>', unsafe_allow_html=True)
-        c3.markdown(f'<div class="info-card">Kalan Hak<br><span class="big">{left}</span> / {MAX_YEAR}</div>', unsafe_allow_html=True)
+        # Tüm limit kuralları tek sorguda (depo seçimine bağlı kurallar kayıt sırasında ayrıca denetlenir)
+        quotas = evaluate_quota(hr)
+        once_limit = min((q["max_koli"] for q in quotas if q["period"] == "once"), default=None)
+        windowed = [q for q in quotas if q["period"] != "once"]
+        if windowed:
+            cols = st.columns(len(windowed))
+            for col, q in zip(cols, windowed):
+                col.markdown(f'<div class="info-card">{q["name"]} – Kalan Hak<br><span class="big">{q["remaining"]}</span> / {q["max_koli"]}'
+                             f' <span style="opacity:0.8">(kullanılan {q["used"]})</span></div>', unsafe_allow_html=True)
 
     # Listeler
     conn = get_conn(); cur = conn.cursor()
@@ -379,12 +273,18 @@ elif page == "Koli Ver":
     else:
         leader_options = leaders; leader_disabled = False; leader_index = 0
 
+    # Kural tablosunda 1'den küçük tek seferlik sınır kalmışsa (eski kayıt) form kullanılamaz
+    blocked_once = once_limit is not None and once_limit < 1
+    if blocked_once:
+        st.error(f"Tek seferlik limit kuralı {once_limit} koliye ayarlı; koli verilemez. Limit Kuralları'nı kontrol edin.")
+
     with st.form("koli_form", border=True):
         form_serial = st.text_input("Form Seri No *", placeholder="Örn: FSN-2025-000123").strip()
-        koli = st.number_input("Koli Sayısı *", min_value=1, max_value=MAX_ONCE, step=1, value=1)
+        koli = st.number_input("Koli Sayısı *", min_value=1, max_value=None if blocked_once else once_limit,
+                               step=1, value=1, disabled=blocked_once)
         vardiya = st.selectbox("Vardiya Amiri *", options=leader_options, index=leader_index, disabled=leader_disabled)
         depo = st.selectbox("Depo *", options=warehouses, index=0)
-        submitted = st.form_submit_button("Kaydı Oluştur")
+        submitted = st.form_submit_button("Kaydı Oluştur", disabled=blocked_once)
 
         if submitted:
             if not hr or not form_serial or not vardiya or not depo:
@@ -394,35 +294,33 @@ elif page == "Koli Ver":
                 if role == "admin" and st.session_state.user["username"] != "admin" and current_leader in leaders:
                     vardiya = current_leader
 
-                used_year = last_year_total_for(hr)
-                remaining = MAX_YEAR - used_year
-                if koli > MAX_ONCE:
-                    st.error(f"Tek seferde en fazla {MAX_ONCE} koli verilebilir.")
-                elif remaining <= 0:
-                    st.error(f"Yıllık limit ({MAX_YEAR}) dolmuş. Yeni koli verilemez.")
-                elif koli > remaining:
-                    st.error(f"Yıllık limit aşılıyor. Kalan hak: {remaining} koli.")
+                # Limit kuralları + yazma tek yazıcı thread'inde, aynı transaction'da
+                fut = issue_scrap(hr, koli, vardiya, depo, form_serial,
+                                  created_by=st.session_state.user["username"])
+                try:
+                    rec_id = fut.result(timeout=WRITE_TIMEOUT_S)
+                except (QuotaExceeded, DuplicateFormSerial) as e:
+                    st.error(str(e))
+                except TimeoutError:
+                    # Kuyruktaysa geri çekilir; yazıcı başlamışsa kayıt yine de commit edilebilir
+                    if fut.cancel():
+                        st.error("Veritabanı zamanında yanıt vermedi; kayıt oluşturulmadı. Tekrar deneyebilirsiniz.")
+                    else:
+                        st.warning("Veritabanı geç yanıt veriyor; kayıt oluşmuş olabilir. Tekrar denemeden önce "
+                                   "Kayıtlar sayfasında Form Seri No ile kontrol edin (aynı seri no ikinci kez kaydedilmez).")
+                except Exception as e:
+                    st.error(f"Kayıt yazılamadı: {e}")
                 else:
-                    upsert_person_minimal(hr, vardiya, depo)
-                    rec_id = record_scrap(hr, koli, vardiya, depo, form_serial)
                     st.success("Kayıt eklendi.")
+                    # Oturumda yalnızca id tutulur; PDF disk önbelleğinden okunur
+                    st.session_state["last_receipt_id"] = rec_id
 
-                    conn = get_conn(); cur = conn.cursor()
-                    cur.execute("""
-                        SELECT id, harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial,
-                               datetime(created_at) AS created_at
-                        FROM scrap_records WHERE id=?
-                    """, (rec_id,))
-                    r = cur.fetchone(); conn.close()
-                    rec = dict(r); rec["created_by"] = st.session_state.user["username"]
-                    st.session_state["last_pdf_bytes"] = make_receipt_pdf(rec)
-                    st.session_state["last_pdf_name"]  = f"HKTS_FIS_{rec['id']}.pdf"
-
-    if st.session_state.get("last_pdf_bytes"):
-        st.download_button("PDF Fişi İndir",
-            data=st.session_state["last_pdf_bytes"],
-            file_name=st.session_state.get("last_pdf_name","HKTS_FIS.pdf"),
-            mime="application/pdf")
+    if st.session_state.get("last_receipt_id"):
+        rec_id = st.session_state["last_receipt_id"]
+        pdf = receipt_for_id(rec_id)
+        if pdf:
+            st.download_button("PDF Fişi İndir", data=pdf,
+                file_name=f"HKTS_FIS_{rec_id}.pdf", mime="application/pdf")
 
 elif page == "Personeller":
     st.subheader("Personeller")
@@ -476,6 +374,27 @@ elif page == "Kayıtlar":
             mime="text/csv"
         )
 
+    if not df.empty:
+        st.markdown("#### Fiş Yeniden Yazdır")
+        c1, c2 = st.columns(2)
+        serials = dict(zip(df["id"], df["Form Seri No"]))
+        reprint_id = c1.selectbox("Kayıt (id – Form Seri No)", options=list(serials),
+                                  format_func=lambda i: f"{i} – {serials[i]}")
+        # PDF yalnızca istendiğinde okunur/üretilir, her rerun'da değil
+        if c1.button("Fişi Hazırla"):
+            pdf = receipt_for_id(reprint_id)
+            if pdf:
+                c1.download_button("Fişi İndir", data=pdf, file_name=f"HKTS_FIS_{reprint_id}.pdf",
+                                   mime="application/pdf")
+        if role == "admin" and len(df) > BATCH_MAX_PAGES:
+            c2.warning(f"Filtrelenen {len(df)} kayıt toplu fiş sınırını ({BATCH_MAX_PAGES}) aşıyor; "
+                       "toplu fiş için filtreyi daraltın (ör. tek amir / tarih).")
+        elif role == "admin":
+            c2.caption(f"Filtrelenen {len(df)} kaydın fişleri tek PDF olarak (ör. bir vardiyanın tüm kayıtları).")
+            if c2.button("Toplu Fiş Hazırla"):
+                c2.download_button("Toplu Fiş PDF İndir", data=batch_receipts_pdf(df["id"].tolist()),
+                                   file_name="HKTS_FISLER.pdf", mime="application/pdf")
+
 elif page == "Raporlar":
     st.subheader("Raporlar – Amir • Depo • Tarih kırılımı")
 
@@ -541,6 +460,100 @@ elif page == "Raporlar":
     else:
         st.info("Kayıt bulunamadı.")
 
+elif page == "Limit Raporu":
+    st.subheader("Limit Raporu")
+    st.caption("Tüm aktif limit kurallarına göre (Limit Kuralları). Depo kuralları kişinin son kaydındaki depoya "
+               "göre uygulanır; her kişi için kalan hakkı en az olan kural gösterilir. "
+               f"Sonuçlar en fazla {QUOTA_REPORT_TTL_S} sn önbellekte tutulur.")
+
+    conn = get_conn(); cur = conn.cursor()
+    cur.execute("SELECT name FROM shift_leaders ORDER BY name;")
+    all_leaders = [r["name"] for r in cur.fetchall()]
+    cur.execute("SELECT name FROM warehouses ORDER BY name;")
+    all_depos = [r["name"] for r in cur.fetchall()]
+    conn.close()
+
+    c1, c2, c3 = st.columns(3)
+    leaders_sel = c1.multiselect("Vardiya Amiri (boş = tümü)", options=all_leaders, default=[], key="lr_amir")
+    depos_sel   = c2.multiselect("Depo (boş = tümü)", options=all_depos, default=[], key="lr_depo")
+    near_pct    = c3.slider("Sınıra yakın eşiği (%)", min_value=50, max_value=100, value=80, step=5)
+    only_near   = st.toggle("Sadece sınıra yakın / limiti dolanlar", value=True)
+
+    if st.button("Yenile", key="lr_refresh"):
+        cached_quota_usage.clear()
+    df = quota_status(cached_quota_usage(tuple(sorted(leaders_sel)), tuple(sorted(depos_sel))),
+                      near_ratio=near_pct / 100)
+    if only_near:
+        df = df[df["durum"] != "Normal"]
+
+    m1, m2 = st.columns(2)
+    m1.markdown(f'<div class="info-card">Sınıra Yakın<br><span class="big">{int((df["durum"] == "Sınıra Yakın").sum())}</span> kişi</div>', unsafe_allow_html=True)
+    m2.markdown(f'<div class="info-card">Limit Doldu<br><span class="big">{int((df["durum"] == "Limit Doldu").sum())}</span> kişi</div>', unsafe_allow_html=True)
+    st.write("")
+
+    if not df.empty:
+        view = df.rename(columns={
+            "harmony_ref": "Harmony Ref", "ad_soyad": "Ad Soyad", "vardiya_amiri": "Son Amir",
+            "depo": "Son Depo", "kural": "Kural", "max_koli": "Limit", "kullanilan": "Kullanılan",
+            "kalan": "Kalan Hak", "ilk_kayit": "İlk Kayıt", "son_kayit": "Son Kayıt",
+            "hak_acilis_tarihi": "Hak Açılış Tarihi", "kullanim_orani": "Kullanım Oranı",
+            "engelleyen_kurallar": "Dolan Kurallar", "durum": "Durum",
+        })
+        st.data_editor(view, height=420, use_container_width=True, disabled=True)
+
+        c1, c2 = st.columns(2)
+        # Binlerce satırda Excel üretimi saniyeler sürer; yalnızca istendiğinde hazırlanır
+        if c1.button("Excel Hazırla"):
+            out = BytesIO()
+            with pd.ExcelWriter(out, engine="openpyxl") as xw:
+                view.to_excel(xw, index=False, sheet_name="Limit")
+            c1.download_button("Excel İndir", data=out.getvalue(), file_name="HKTS_Limit_Raporu.xlsx",
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        c2.download_button("CSV Olarak İndir", view.to_csv(index=False).encode("utf-8"),
+                           file_name="limit_raporu.csv", mime="text/csv")
+    else:
+        st.info("Kayıt bulunamadı.")
+
+elif page == "Limit Kuralları":
+    st.subheader("Limit Kuralları")
+    st.caption("Dönem: once = tek seferlik üst sınır, rolling = son N gün, month = takvim ayı, year = takvim yılı. "
+               "Depo / Görev boş bırakılırsa kural herkese uygulanır; depo kurallarında yalnızca o depodaki kayıtlar sayılır.")
+    rules = list_quota_rules()
+    conn = get_conn(); cur = conn.cursor()
+    cur.execute("SELECT name FROM warehouses ORDER BY name;")
+    warehouses = [r["name"] for r in cur.fetchall()]
+    cur.execute("SELECT DISTINCT gorevi FROM personnel WHERE COALESCE(gorevi, '') != '' ORDER BY gorevi;")
+    roles = [r["gorevi"] for r in cur.fetchall()]
+    conn.close()
+    edited = st.data_editor(
+        rules, num_rows="dynamic", use_container_width=True, hide_index=True,
+        column_config={
+            "id": st.column_config.NumberColumn("id", disabled=True),
+            "name": st.column_config.TextColumn("Ad", required=True),
+            "period": st.column_config.SelectboxColumn("Dönem", options=list(QUOTA_PERIODS), required=True),
+            "days": st.column_config.NumberColumn("Gün", min_value=1, step=1),
+            "max_koli": st.column_config.NumberColumn("Azami Koli", min_value=0, step=1, required=True),
+            "depo": st.column_config.SelectboxColumn("Depo", options=warehouses),
+            "gorevi": st.column_config.SelectboxColumn("Görev", options=roles),
+            "active": st.column_config.CheckboxColumn("Aktif", default=True),
+        },
+    )
+    if st.button("Kuralları Kaydet"):
+        def _opt(v):
+            return None if pd.isna(v) or str(v).strip() == "" else v
+        try:
+            rows = [(
+                None if pd.isna(r["id"]) else int(r["id"]), str(r["name"]).strip(), r["period"],
+                None if pd.isna(r["days"]) else int(r["days"]), int(r["max_koli"]),
+                _opt(r["depo"]), _opt(r["gorevi"]), 1 if r["active"] is True or r["active"] == 1 else 0,
+            ) for _, r in edited.iterrows()]
+            n = save_quota_rules(rows).result(timeout=WRITE_TIMEOUT_S)
+            st.success(f"{n} kural kaydedildi.")
+        except TimeoutError:
+            st.error("Veritabanı zamanında yanıt vermedi; kurallar kaydedilmemiş olabilir.")
+        except Exception as e:
+            st.error(f"Kurallar kaydedilemedi: {e}")
+
 elif page == "Excel Yükle":
     st.subheader("Haftalık Personel Listesi Yükle")
     st.caption("Şablon sütunları: Servis Lokasyonu, Harmony Ref, Kayıt No, Adı, Soyadı, Görevi, Telefon, İş Telefonu, Dahili, İşe Giriş Tarihi, İşten Çıkış, Tarihi, Güzergah, Cadde, Durak, Adres, ilçe, Ana Süreç, Detay Süreç, Giriş Lokasyonu, Çıkış Lokasyonu, Beyaz Yaka, Servis, Ad Soyad")
@@ -560,53 +573,18 @@ elif page == "Excel Yükle":
                 if missing:
                     st.error(f"Eksik sütun(lar): {missing}")
                 else:
-                    conn = get_conn(); cur = conn.cursor()
-                    cnt=0
-                    for _, r in df.iterrows():
-                        if not str(r["Harmony Ref"]).strip():
-                            continue
-                        cur.execute("""
-                            INSERT INTO personnel(
-                                harmony_ref,kayit_no,adi,soyadi,gorevi,telefon,is_telefonu,dahili,
-                                ise_giris_tarihi,isten_cikis_tarihi,tarihi,guzergah,cadde,durak,adres,
-                                ilce,ana_surec,detay_surec,giris_lokasyonu,cikis_lokasyonu,beyaz_yaka,
-                                servis,ad_soyad,servis_lokasyonu
-                            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                            ON CONFLICT(harmony_ref) DO UPDATE SET
-                                kayit_no=excluded.kayit_no,
-                                adi=excluded.adi,
-                                soyadi=excluded.soyadi,
-                                gorevi=excluded.gorevi,
-                                telefon=excluded.telefon,
-                                is_telefonu=excluded.is_telefonu,
-                                dahili=excluded.dahili,
-                                ise_giris_tarihi=excluded.ise_giris_tarihi,
-                                isten_cikis_tarihi=excluded.isten_cikis_tarihi,
-                                tarihi=excluded.tarihi,
-                                guzergah=excluded.guzergah,
-                                cadde=excluded.cadde,
-                                durak=excluded.durak,
-                                adres=excluded.adres,
-                                ilce=excluded.ilce,
-                                ana_surec=excluded.ana_surec,
-                                detay_surec=excluded.detay_surec,
-                                giris_lokasyonu=excluded.giris_lokasyonu,
-                                cikis_lokasyonu=excluded.cikis_lokasyonu,
-                                beyaz_yaka=excluded.beyaz_yaka,
-                                servis=excluded.servis,
-                                ad_soyad=excluded.ad_soyad,
-                                servis_lokasyonu=excluded.servis_lokasyonu
-                        """, (
-                            r["Harmony Ref"].strip(), r["Kayıt No"], r["Adı"], r["Soyadı"], r["Görevi"],
-                            r["Telefon"], r["İş Telefonu"], r["Dahili"], r["İşe Giriş Tarihi"], r["İşten Çıkış"],
-                            r["Tarihi"], r["Güzergah"], r["Cadde"], r["Durak"], r["Adres"], r["ilçe"],
-                            r["Ana Süreç"], r["Detay Süreç"], r["Giriş Lokasyonu"], r["Çıkış Lokasyonu"],
-                            int(r["Beyaz Yaka"]) if str(r["Beyaz Yaka"]).strip().isdigit() else None,
-                            r["Servis"], r["Ad Soyad"], r.get("Servis Lokasyonu","")
-                        ))
-                        cnt += 1
-                    conn.commit(); conn.close()
+                    rows = [(
+                        r["Harmony Ref"].strip(), r["Kayıt No"], r["Adı"], r["Soyadı"], r["Görevi"],
+                        r["Telefon"], r["İş Telefonu"], r["Dahili"], r["İşe Giriş Tarihi"], r["İşten Çıkış"],
+                        r["Tarihi"], r["Güzergah"], r["Cadde"], r["Durak"], r["Adres"], r["ilçe"],
+                        r["Ana Süreç"], r["Detay Süreç"], r["Giriş Lokasyonu"], r["Çıkış Lokasyonu"],
+                        int(r["Beyaz Yaka"]) if str(r["Beyaz Yaka"]).strip().isdigit() else None,
+                        r["Servis"], r["Ad Soyad"], r.get("Servis Lokasyonu","")
+                    ) for _, r in df.iterrows() if str(r["Harmony Ref"]).strip()]
+                    cnt = import_personnel(rows).result(timeout=WRITE_TIMEOUT_S)
                     st.success(f"Yükleme tamamlandı. Güncellenen/eklenen kişi sayısı: {cnt}")
+            except TimeoutError:
+                st.error("Veritabanı zamanında yanıt vermedi; yükleme tamamlanmamış olabilir.")
             except Exception as e:
                 st.error(f"Yükleme hatası: {e}")
 
@@ -0,0 +1,192 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from datetime import datetime
+
+from passlib.context import CryptContext
+
+from db import (
+    DB_PATH, WRITE_TIMEOUT_S, get_conn, create_user, update_password_hash,
+    open_session, close_session
+)
+
+# Hash politikası ortam değişkenleriyle ayarlanır. Tur sayısı değiştiğinde eski hash'ler
+# giriş sırasında (şifre zaten doğrulanmışken) yeni politikayla yeniden hash'lenir.
+PBKDF2_ROUNDS = int(os.environ.get("HKTS_PBKDF2_ROUNDS", "29000"))
+SESSION_TTL_S = int(os.environ.get("HKTS_SESSION_TTL_S", str(12 * 3600)))
+
+def make_context(rounds: int = PBKDF2_ROUNDS) -> CryptContext:
+    # min = max = default: farklı tur sayısıyla üretilmiş her hash needs_update sayılır
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        deprecated="auto",
+        pbkdf2_sha256__default_rounds=rounds,
+        pbkdf2_sha256__min_rounds=rounds,
+        pbkdf2_sha256__max_rounds=rounds,
+    )
+
+pwd_context = make_context()
+
+def hash_it(s: str) -> str:
+    return pwd_context.hash(s)
+
+def verify_it(pw: str, hashed: str) -> bool:
+    return pwd_context.verify(pw, hashed)
+
+def authenticate(username, password, role_choice):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM users WHERE username=?", (username,))
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return False, "Kullanıcı bulunamadı."
+    if row["role"] != role_choice:
+        return False, "Rol uyuşmuyor. Doğru giriş tipini seçin."
+    ok, new_hash = pwd_context.verify_and_update(password, row["password_hash"])
+    if not ok:
+        return False, "Şifre hatalı."
+    if new_hash:
+        # Yazıcı kuyruğunda tek UPDATE; beklenir ki ardından verilen oturum jetonu yeni hash'e bağlansın.
+        # Yazılamazsa giriş yine başarılıdır; rehash sonraki girişte tekrar denenir.
+        try:
+            update_password_hash(row["id"], new_hash).result(timeout=WRITE_TIMEOUT_S)
+        except Exception:
+            pass
+    return True, {"id": row["id"], "username": row["username"], "role": row["role"]}
+
+def register_user(username, password, role_choice):
+    if len(username) < 3 or len(password) < 6:
+        return False, "Kullanıcı adı ≥3, şifre ≥6 karakter olmalı."
+    try:
+        create_user(username, hash_it(password), role_choice).result(timeout=WRITE_TIMEOUT_S)
+        return True, "Kayıt başarılı."
+    except Exception as e:
+        return False, f"Kayıt alınamadı: {e}"
+
+def reset_password(username):
+    temp = "Sifirla_" + datetime.now().strftime("%H%M%S")
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM users WHERE username=?", (username,))
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return False, "Kullanıcı bulunamadı."
+    try:
+        update_password_hash(row["id"], hash_it(temp)).result(timeout=WRITE_TIMEOUT_S)
+    except Exception as e:
+        return False, f"Şifre sıfırlanamadı: {e}"
+    return True, f"Geçici şifre: {temp}"
+
+# ---------- oturum jetonu (sayfa yenilemede şifresiz devam)
+# Jeton URL'de (?s=...) taşınır; tarayıcı geçmişinde, yer imlerinde ve paylaşılan
+# bağlantılarda görünür. Bu yüzden her jeton user_sessions'taki bir nonce'a bağlıdır:
+# çıkışta nonce silinir ve geçmişten açılan URL artık oturum açmaz. Ortak kullanılan
+# kapı bilgisayarlarında vardiya sonunda mutlaka "Çıkış" yapılmalıdır; çıkış yapılmayan
+# jeton HKTS_SESSION_TTL_S süresince geçerli kalır.
+_SECRET_PATH = DB_PATH.with_name("session_secret")
+_secret = None
+
+def _session_secret() -> bytes:
+    """HKTS_SESSION_SECRET yoksa DB yanındaki dosyadan okunur / ilk seferde üretilir.
+    Dosyada saklandığı için uygulama yeniden başlasa da jetonlar geçerli kalır."""
+    global _secret
+    if _secret is None:
+        env = os.environ.get("HKTS_SESSION_SECRET")
+        if env:
+            _secret = env.encode("utf-8")
+        else:
+            try:
+                _secret = _SECRET_PATH.read_bytes()
+            except OSError:
+                secret = secrets.token_bytes(32)
+                try:
+                    fd = os.open(_SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                except FileExistsError:
+                    # Başka bir süreç/thread aynı anda oluşturdu
+                    secret = _SECRET_PATH.read_bytes()
+                else:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(secret)
+                _secret = secret
+    return _secret
+
+def _b64(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).rstrip(b"=").decode("ascii")
+
+def _unb64(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64(hmac.new(_session_secret(), payload.encode("ascii"), hashlib.sha256).digest())
+
+def _hash_fingerprint(password_hash: str) -> str:
+    # Şifre değişince (sıfırlama dahil) eski jetonlar geçersiz olur
+    return hashlib.sha256(password_hash.encode("utf-8")).hexdigest()[:16]
+
+def _parse_token(token: str):
+    """İmzası geçerli jetonun içeriğini döner; aksi halde None."""
+    try:
+        payload, sig = token.split(".", 1)
+        if not hmac.compare_digest(sig, _sign(payload)):
+            return None
+        data = json.loads(_unb64(payload))
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+def issue_session_token(user: dict, ttl_s: int = SESSION_TTL_S):
+    """Yeni sunucu tarafı oturum açar ve imzalı jetonu döner; oturum yazılamazsa None."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT password_hash FROM users WHERE id=?", (user["id"],))
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return None
+    nonce = secrets.token_urlsafe(16)
+    exp = int(time.time()) + ttl_s
+    try:
+        open_session(nonce, user["id"], exp).result(timeout=WRITE_TIMEOUT_S)
+    except Exception:
+        return None
+    payload = _b64(json.dumps({
+        "uid": user["id"], "role": user["role"], "exp": exp, "sid": nonce,
+        "pwv": _hash_fingerprint(row["password_hash"]),
+    }, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+def resume_session(token: str):
+    """İmzalı, süresi dolmamış ve iptal edilmemiş jetondan kullanıcıyı döner; aksi halde None.
+    Şifre doğrulaması yapılmaz; yalnızca nonce ile tek bir indeksli okuma yapılır."""
+    data = _parse_token(token)
+    if not data or not isinstance(data.get("exp"), int) or data["exp"] < time.time():
+        return None
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT u.id, u.username, u.role, u.password_hash
+        FROM user_sessions s JOIN users u ON u.id = s.user_id
+        WHERE s.nonce=? AND s.expires_at >= ?
+    """, (str(data.get("sid", "")), int(time.time())))
+    row = cur.fetchone()
+    conn.close()
+    if not row or row["id"] != data.get("uid") or row["role"] != data.get("role") \
+            or not hmac.compare_digest(_hash_fingerprint(row["password_hash"]), str(data.get("pwv", ""))):
+        return None
+    return {"id": row["id"], "username": row["username"], "role": row["role"]}
+
+def revoke_session(token: str) -> bool:
+    """Çıkışta jetonu sunucu tarafında geçersiz kılar (URL geçmişten açılsa da devam edilemez)."""
+    data = _parse_token(token) if token else None
+    if not data or not data.get("sid"):
+        return False
+    try:
+        return close_session(str(data["sid"])).result(timeout=WRITE_TIMEOUT_S) > 0
+    except Exception:
+        return False
@@ -1,11 +1,26 @@
+import atexit
+import logging
+import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from datetime import datetime, timedelta
 
-DB_PATH = Path(__file__).with_name("hkts.db")
+import pandas as pd
+
+# HKTS_DB_PATH: yük testi vb. için ayrı veritabanı dosyası
+DB_PATH = Path(os.environ.get("HKTS_DB_PATH") or Path(__file__).with_name("hkts.db"))
+BUSY_TIMEOUT_S = 30
+# Yazıcı Future'ları için azami bekleme; aşılırsa çağıran TimeoutError alır. Yazıcının kilit
+# beklemesinden (BUSY_TIMEOUT_S) uzun tutulur ki çağıran, yazı hâlâ sürerken vazgeçmesin.
+WRITE_TIMEOUT_S = 2 * BUSY_TIMEOUT_S
+
+log = logging.getLogger(__name__)
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_S)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -17,6 +32,9 @@ def init_db():
     conn = get_conn()
     cur = conn.cursor()
 
+    # WAL: okuyucular tek yazıcıyı beklemez (kalıcı ayar, dosyada saklanır)
+    cur.execute("PRAGMA journal_mode=WAL;")
+
     # USERS
     cur.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -28,6 +46,16 @@ def init_db():
     );
     """)
 
+    # OTURUMLAR (imzalı jetondaki nonce; çıkışta silinerek jeton sunucu tarafında iptal edilir)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        nonce TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    );
+    """)
+
     # PERSONNEL
     cur.execute("""
     CREATE TABLE IF NOT EXISTS personnel (
@@ -69,6 +97,7 @@ def init_db():
         vardiya_amiri TEXT NOT NULL,
         depo TEXT NOT NULL,
         form_serial TEXT NOT NULL,
+        created_by TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (harmony_ref) REFERENCES personnel(harmony_ref)
     );
@@ -79,6 +108,18 @@ def init_db():
         cur.execute("ALTER TABLE scrap_records ADD COLUMN form_serial TEXT;")
         cur.execute("UPDATE scrap_records SET form_serial = COALESCE(form_serial, 'GECMISIYUKLEME');")
 
+    # Fişin sonradan yeniden basılabilmesi için kaydı gireni sakla
+    if not _column_exists(cur, "scrap_records", "created_by"):
+        cur.execute("ALTER TABLE scrap_records ADD COLUMN created_by TEXT;")
+
+    # Limit sorguları (kişi + pencere) için kapsayan indeks: depo ve koli indeksten okunur,
+    # kişi başına son kayıt da MAX(created_at) ile tablo taranmadan bulunur
+    cur.execute("DROP INDEX IF EXISTS idx_scrap_ref_created;")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_scrap_quota
+                   ON scrap_records(harmony_ref, created_at, depo, koli_sayisi);""")
+    # Aynı formun ikinci kez kaydını yazıcıda reddetmek için (eski kayıtlarda tekrar olabilir, UNIQUE değil)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scrap_form_serial ON scrap_records(form_serial);")
+
     # Referans tablolar
     cur.execute("""CREATE TABLE IF NOT EXISTS shift_leaders (name TEXT PRIMARY KEY);""")
     cur.execute("""CREATE TABLE IF NOT EXISTS warehouses (name TEXT PRIMARY KEY);""")
@@ -95,38 +136,64 @@ def init_db():
     for w in warehouses:
         cur.execute("INSERT OR IGNORE INTO warehouses(name) VALUES(?)", (w,))
 
+    # LİMİT KURALLARI (depo / görev boşsa tümüne uygulanır)
+    # Varsayılanlar yalnızca tablo ilk oluşturulurken eklenir; yönetici tüm kuralları
+    # silerse init_db her rerun'da onları geri getirmemeli.
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='quota_rules';")
+    seed_rules = cur.fetchone() is None
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS quota_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        period TEXT CHECK(period IN ('once','rolling','month','year')) NOT NULL,
+        days INTEGER,
+        max_koli INTEGER NOT NULL,
+        depo TEXT,
+        gorevi TEXT,
+        active INTEGER NOT NULL DEFAULT 1
+    );
+    """)
+    if seed_rules:
+        # Önceki sabit limitler: tek seferde 15, son 365 günde 45
+        cur.executemany("INSERT INTO quota_rules(name, period, days, max_koli) VALUES(?,?,?,?)", [
+            ("Tek Sefer", "once", None, 15),
+            ("Yıllık", "rolling", 365, 45),
+        ])
+
     conn.commit()
     conn.close()
 
 def ensure_default_users(hasher):
+    """Varsayılan kullanıcıları yoksa ekler. Hash yalnızca eksik kullanıcı için hesaplanır;
+    tur sayısı yükseltildiğinde bu çağrı sayfa etkileşimlerini pahalılaştırmaz."""
+    defaults = [("admin", "admin123", "admin"), ("guvenlik", "guvenlik123", "security")]
     conn = get_conn()
     cur = conn.cursor()
-    try:
-        cur.execute("INSERT INTO users(username, password_hash, role) VALUES(?,?,?)",
-                    ("admin", hasher("admin123"), "admin"))
-    except Exception:
-        pass
-    try:
-        cur.execute("INSERT INTO users(username, password_hash, role) VALUES(?,?,?)",
-                    ("guvenlik", hasher("guvenlik123"), "security"))
-    except Exception:
-        pass
+    cur.execute("SELECT username FROM users WHERE username IN (?,?)", tuple(u for u, _, _ in defaults))
+    existing = {r["username"] for r in cur.fetchall()}
+    for username, password, role in defaults:
+        if username not in existing:
+            cur.execute("INSERT OR IGNORE INTO users(username, password_hash, role) VALUES(?,?,?)",
+                        (username, hasher(password), role))
     conn.commit()
     conn.close()
 
-def last_year_total_for(harmony_ref: str) -> int:
-    """Son 365 gün içinde verilen koli toplamı."""
+def get_receipt_records(ids) -> list:
+    """Fiş basımı için kayıtları id sırasıyla döner (bulunamayanlar atlanır)."""
+    ids = [int(i) for i in ids]
+    found = {}
     conn = get_conn()
     cur = conn.cursor()
-    since = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d %H:%M:%S")
-    cur.execute("""
-        SELECT COALESCE(SUM(koli_sayisi),0) AS total
-        FROM scrap_records
-        WHERE harmony_ref=? AND created_at >= ?
-    """, (harmony_ref, since))
-    row = cur.fetchone()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i+500]
+        cur.execute(f"""
+            SELECT id, harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial,
+                   COALESCE(created_by, '-') AS created_by, datetime(created_at) AS created_at
+            FROM scrap_records WHERE id IN ({",".join("?" * len(chunk))})
+        """, chunk)
+        found.update({r["id"]: dict(r) for r in cur.fetchall()})
     conn.close()
-    return int(row["total"] if row and row["total"] is not None else 0)
+    return [found[i] for i in ids if i in found]
 
 def totals():
     conn = get_conn()
@@ -156,3 +223,459 @@ def group_totals_by(field: str):
     labels = [r["grp"] for r in rows]
     values = [int(r["toplam"] or 0) for r in rows]
     return labels, values
+
+# ---------- limit kuralları motoru
+class QuotaExceeded(ValueError):
+    """Koli verme isteği limit nedeniyle reddedildi; mesaj kullanıcıya gösterilebilir."""
+
+class DuplicateFormSerial(ValueError):
+    """Aynı Form Seri No ile kayıt zaten var (ör. zaman aşımından sonra tekrar gönderim)."""
+
+QUOTA_PERIODS = ("once", "rolling", "month", "year")
+
+# Kuralın sayım penceresinin başlangıcı ('once' için NULL); kişi ve rapor sorgularında ortak.
+# created_at UTC saklanır (CURRENT_TIMESTAMP): ay/yıl başı yerel saatte alınıp UTC'ye çevrilir.
+_RULE_SINCE_SQL = """
+           CASE q.period
+               WHEN 'rolling' THEN datetime('now', '-' || q.days || ' days')
+               WHEN 'month'   THEN datetime('now', 'localtime', 'start of month', 'utc')
+               WHEN 'year'    THEN datetime('now', 'localtime', 'start of year', 'utc')
+           END"""
+
+_QUOTA_SQL = f"""
+WITH rules AS (
+    SELECT q.id, q.name, q.period, q.days, q.max_koli, q.depo, q.gorevi,{_RULE_SINCE_SQL} AS since
+    FROM quota_rules q
+    WHERE q.active = 1
+      AND (q.depo IS NULL OR q.depo = :depo)
+      AND (q.gorevi IS NULL OR q.gorevi = (SELECT gorevi FROM personnel WHERE harmony_ref = :ref))
+)
+SELECT r.id, r.name, r.period, r.days, r.max_koli, r.depo, r.gorevi, r.since,
+       COALESCE(SUM(s.koli_sayisi), 0) AS used
+FROM rules r
+LEFT JOIN scrap_records s
+       ON r.since IS NOT NULL
+      AND s.harmony_ref = :ref
+      AND s.created_at >= r.since
+      AND (r.depo IS NULL OR s.depo = r.depo)
+GROUP BY r.id
+ORDER BY r.id
+"""
+
+def evaluate_quota(harmony_ref: str, depo=None, conn=None) -> list:
+    """Kişiye uygulanan tüm aktif kuralların kullanım / kalan hakkını tek sorguda döner.
+
+    depo verilmezse yalnızca depo'dan bağımsız kurallar değerlendirilir. Depo'ya özgü
+    kurallarda kullanım yalnızca o depodaki kayıtlardan sayılır. 'once' kuralı tek
+    seferlik üst sınırdır; kullanımı yoktur, kalan hak her zaman max_koli'dir.
+    conn verilirse (ör. yazıcı transaction'ı) o bağlantı kullanılır.
+    """
+    own = conn is None
+    if own:
+        conn = get_conn()
+    rows = conn.execute(_QUOTA_SQL, {"ref": harmony_ref, "depo": depo}).fetchall()
+    if own:
+        conn.close()
+    out = []
+    for r in rows:
+        d = dict(r)
+        d["used"] = int(d["used"])
+        d["remaining"] = d["max_koli"] if d["period"] == "once" else max(0, d["max_koli"] - d["used"])
+        out.append(d)
+    return out
+
+def check_quota(results: list, koli_sayisi: int):
+    """evaluate_quota sonucuna göre koli_sayisi verilemiyorsa QuotaExceeded fırlatır."""
+    for q in results:
+        if q["period"] == "once":
+            if koli_sayisi > q["max_koli"]:
+                raise QuotaExceeded(f"Tek seferde en fazla {q['max_koli']} koli verilebilir.")
+        elif q["remaining"] <= 0:
+            raise QuotaExceeded(f"{q['name']} limiti ({q['max_koli']}) dolmuş. Yeni koli verilemez.")
+        elif koli_sayisi > q["remaining"]:
+            raise QuotaExceeded(f"{q['name']} limiti aşılıyor. Kalan hak: {q['remaining']} koli.")
+
+_QUOTA_REPORT_SQL = f"""
+WITH rules AS MATERIALIZED (
+    SELECT q.id, q.name, q.period, q.days, q.max_koli, q.depo, q.gorevi,{_RULE_SINCE_SQL} AS since
+    FROM quota_rules q
+    WHERE q.active = 1 AND q.period != 'once'
+),
+usage AS MATERIALIZED (
+    -- Kişi x uygulanan kural; kullanım kişinin indeks aralığından okunur
+    SELECT l.harmony_ref, p.ad_soyad, s.vardiya_amiri, s.depo, l.son_kayit,
+           r.id AS kural_id, r.name AS kural, r.period, r.days, r.max_koli,
+           (SELECT COALESCE(SUM(u.koli_sayisi), 0) FROM scrap_records u
+             WHERE u.harmony_ref = l.harmony_ref AND u.created_at >= r.since
+               AND (r.depo IS NULL OR u.depo = r.depo)) AS kullanilan,
+           (SELECT MIN(u.created_at) FROM scrap_records u
+             WHERE u.harmony_ref = l.harmony_ref AND u.created_at >= r.since
+               AND (r.depo IS NULL OR u.depo = r.depo)) AS ilk_kayit
+    FROM (SELECT harmony_ref, MAX(created_at) AS son_kayit, id
+          FROM scrap_records GROUP BY harmony_ref) l
+    JOIN scrap_records s ON s.id = l.id
+    LEFT JOIN personnel p ON p.harmony_ref = l.harmony_ref
+    JOIN rules r
+      ON (r.depo IS NULL OR r.depo = s.depo)
+     AND (r.gorevi IS NULL OR r.gorevi = p.gorevi)
+    WHERE 1=1 {{filters}}
+),
+scored AS (
+    SELECT u.*, MAX(u.max_koli - u.kullanilan, 0) AS kalan,
+           COALESCE(u.kullanilan * 1.0 / NULLIF(u.max_koli, 0), 1.0) AS kullanim_orani
+    FROM usage u
+)
+-- Kişi başına en dar kural: kalan hak en az, eşitlikte kullanım oranı en yüksek olan
+-- (oran/(1+oran) < 1 olduğundan kalan sırasını bozmaz). Diğer sütunlar min() satırından gelir.
+SELECT harmony_ref, ad_soyad, vardiya_amiri, depo, kural, max_koli,
+       kullanilan, kalan, kullanim_orani, ilk_kayit, son_kayit,
+       -- Hakkın geri açılacağı yerel tarih: rolling'de en eski kayıt pencereden çıkınca,
+       -- ay/yıl kurallarında yerel dönem başında
+       CASE WHEN kullanilan > 0 THEN
+           CASE period
+               WHEN 'rolling' THEN date(ilk_kayit, '+' || days || ' days', 'localtime')
+               WHEN 'month'   THEN date('now', 'localtime', 'start of month', '+1 month')
+               WHEN 'year'    THEN date('now', 'localtime', 'start of year', '+1 year')
+           END
+       END AS hak_acilis_tarihi,
+       MIN(kalan - kullanim_orani / (1 + kullanim_orani)) AS _sira,
+       COALESCE(group_concat(CASE WHEN kalan <= 0 THEN kural END, ', '), '') AS engelleyen_kurallar
+FROM scored
+GROUP BY harmony_ref
+"""
+
+def quota_usage(leaders=None, depos=None) -> pd.DataFrame:
+    """Koli almış herkes için tüm aktif pencereli kurallara göre kullanım / kalan hak.
+
+    evaluate_quota ile aynı kural seti ve pencere tanımları tek sorguda tüm kişilere
+    uygulanır; depo kuralları kişinin son kaydındaki depoya göre seçilir. Kişi başına
+    en dar (kalan hakkı en az) kural satırı döner; 'engelleyen_kurallar' limiti dolmuş
+    tüm kuralları kural tablosu sırasıyla listeler. leaders/depos kişinin son kaydına göre filtreler.
+    """
+    filters, params = "", {}
+    if leaders:
+        keys = [f"l{i}" for i in range(len(leaders))]
+        filters += " AND s.vardiya_amiri IN ({})".format(",".join(":" + k for k in keys))
+        params.update(zip(keys, leaders))
+    if depos:
+        keys = [f"d{i}" for i in range(len(depos))]
+        filters += " AND s.depo IN ({})".format(",".join(":" + k for k in keys))
+        params.update(zip(keys, depos))
+
+    conn = get_conn()
+    df = pd.read_sql_query(_QUOTA_REPORT_SQL.format(filters=filters), conn, params=params)
+    conn.close()
+    df["kullanim_orani"] = df["kullanim_orani"].round(3)
+    return df.drop(columns="_sira").sort_values(["kalan", "hak_acilis_tarihi"]).reset_index(drop=True)
+
+def quota_status(df: pd.DataFrame, near_ratio: float = 0.8) -> pd.DataFrame:
+    """quota_usage sonucuna eşiğe göre 'durum' sütununu ekler (sorgusuz; eşik değişince yeniden hesaplanır)."""
+    df = df.copy()
+    df["durum"] = "Normal"
+    df.loc[df["kullanim_orani"] >= near_ratio, "durum"] = "Sınıra Yakın"
+    df.loc[df["kalan"] <= 0, "durum"] = "Limit Doldu"
+    return df
+
+def quota_report(leaders=None, depos=None, near_ratio: float = 0.8) -> pd.DataFrame:
+    """quota_usage + quota_status; durum: Normal / Sınıra Yakın / Limit Doldu."""
+    return quota_status(quota_usage(leaders, depos), near_ratio)
+
+def list_quota_rules() -> pd.DataFrame:
+    conn = get_conn()
+    df = pd.read_sql_query("SELECT * FROM quota_rules ORDER BY id", conn)
+    conn.close()
+    return df
+
+# ---------- tek yazıcı kuyruğu (group commit)
+PERSONNEL_UPSERT_SQL = """
+    INSERT INTO personnel(
+        harmony_ref,kayit_no,adi,soyadi,gorevi,telefon,is_telefonu,dahili,
+        ise_giris_tarihi,isten_cikis_tarihi,tarihi,guzergah,cadde,durak,adres,
+        ilce,ana_surec,detay_surec,giris_lokasyonu,cikis_lokasyonu,beyaz_yaka,
+        servis,ad_soyad,servis_lokasyonu
+    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    ON CONFLICT(harmony_ref) DO UPDATE SET
+        kayit_no=excluded.kayit_no,
+        adi=excluded.adi,
+        soyadi=excluded.soyadi,
+        gorevi=excluded.gorevi,
+        telefon=excluded.telefon,
+        is_telefonu=excluded.is_telefonu,
+        dahili=excluded.dahili,
+        ise_giris_tarihi=excluded.ise_giris_tarihi,
+        isten_cikis_tarihi=excluded.isten_cikis_tarihi,
+        tarihi=excluded.tarihi,
+        guzergah=excluded.guzergah,
+        cadde=excluded.cadde,
+        durak=excluded.durak,
+        adres=excluded.adres,
+        ilce=excluded.ilce,
+        ana_surec=excluded.ana_surec,
+        detay_surec=excluded.detay_surec,
+        giris_lokasyonu=excluded.giris_lokasyonu,
+        cikis_lokasyonu=excluded.cikis_lokasyonu,
+        beyaz_yaka=excluded.beyaz_yaka,
+        servis=excluded.servis,
+        ad_soyad=excluded.ad_soyad,
+        servis_lokasyonu=excluded.servis_lokasyonu
+"""
+
+def _w_upsert_person(cur, harmony_ref, vardiya_amiri, depo):
+    cur.execute("""
+        INSERT OR IGNORE INTO personnel(harmony_ref, adi, soyadi, ad_soyad, vardiya_amiri, depo)
+        VALUES(?,?,?,?,?,?)
+    """, (harmony_ref, "", "", "", vardiya_amiri, depo))
+    if cur.rowcount == 0:
+        cur.execute("UPDATE personnel SET vardiya_amiri=?, depo=? WHERE harmony_ref=?",
+                    (vardiya_amiri, depo, harmony_ref))
+
+def _w_issue(cur, harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial, created_by,
+             enforce_quota):
+    koli_sayisi = int(koli_sayisi)
+    cur.execute("SELECT id FROM scrap_records WHERE form_serial=? LIMIT 1", (form_serial,))
+    dup = cur.fetchone()
+    if dup:
+        raise DuplicateFormSerial(f"{form_serial} seri numaralı form zaten kayıtlı (kayıt no {dup['id']}).")
+    if enforce_quota:
+        # Kontrol yazma işlemiyle aynı transaction içinde: eşzamanlı iki istek limiti birlikte aşamaz
+        check_quota(evaluate_quota(harmony_ref, depo, conn=cur.connection), koli_sayisi)
+    _w_upsert_person(cur, harmony_ref, vardiya_amiri, depo)
+    cur.execute("""
+        INSERT INTO scrap_records(harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial, created_by)
+        VALUES (?,?,?,?,?,?)
+    """, (harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial, created_by))
+    return cur.lastrowid
+
+def _w_create_user(cur, username, password_hash, role):
+    cur.execute("INSERT INTO users(username, password_hash, role) VALUES(?,?,?)",
+                (username, password_hash, role))
+    return cur.lastrowid
+
+def _w_open_session(cur, nonce, user_id, expires_at):
+    cur.execute("DELETE FROM user_sessions WHERE expires_at < ?", (int(time.time()),))
+    cur.execute("INSERT INTO user_sessions(nonce, user_id, expires_at) VALUES(?,?,?)",
+                (nonce, user_id, expires_at))
+
+def _w_close_session(cur, nonce):
+    cur.execute("DELETE FROM user_sessions WHERE nonce=?", (nonce,))
+    return cur.rowcount
+
+def _w_set_password_hash(cur, user_id, password_hash):
+    cur.execute("UPDATE users SET password_hash=? WHERE id=?", (password_hash, user_id))
+    return cur.rowcount
+
+def _w_save_quota_rules(cur, rows):
+    """rows: (id|None, name, period, days, max_koli, depo, gorevi, active); listede olmayanlar silinir."""
+    cur.execute("SELECT name FROM warehouses;")
+    known = {r["name"] for r in cur.fetchall()}
+    for r in rows:
+        if r[5] is not None and r[5] not in known:
+            raise ValueError(f"'{r[1]}' kuralındaki depo tanımlı değil: {r[5]}")
+    keep = [r[0] for r in rows if r[0] is not None]
+    cur.execute(f"DELETE FROM quota_rules WHERE id NOT IN ({','.join('?' * len(keep))})", keep)
+    for r in rows:
+        if r[0] is None:
+            cur.execute("""INSERT INTO quota_rules(name, period, days, max_koli, depo, gorevi, active)
+                           VALUES(?,?,?,?,?,?,?)""", r[1:])
+        else:
+            cur.execute("""UPDATE quota_rules SET name=?, period=?, days=?, max_koli=?, depo=?, gorevi=?, active=?
+                           WHERE id=?""", (*r[1:], r[0]))
+    return len(rows)
+
+def _w_import_personnel(cur, rows):
+    cur.executemany(PERSONNEL_UPSERT_SQL, rows)
+    return len(rows)
+
+_WRITE_HANDLERS = {
+    "upsert_person": _w_upsert_person,
+    "issue": _w_issue,
+    "import_personnel": _w_import_personnel,
+    "create_user": _w_create_user,
+    "set_password_hash": _w_set_password_hash,
+    "open_session": _w_open_session,
+    "close_session": _w_close_session,
+    "save_quota_rules": _w_save_quota_rules,
+}
+
+class DBWriter:
+    """Tüm yazma isteklerini tek bağlantı ve tek thread üzerinden sıraya alır.
+
+    Kuyruktaki istekler max_batch adede / max_wait süresine kadar toplanıp tek
+    transaction'da commit edilir (group commit). Her istek kendi SAVEPOINT'inde çalışır;
+    hata veren istek yalnızca kendi Future'ına hata döner, diğerleri commit edilir.
+    Süreç başına bir yazıcı vardır; Streamlit oturumları aynı süreçte olduğu için
+    yazıcılar arasında kilit yarışı oluşmaz.
+    """
+
+    def __init__(self, max_batch: int = 64, max_wait: float = 0.002):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._q = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="hkts-db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind: str, *args) -> Future:
+        if kind not in _WRITE_HANDLERS:
+            raise ValueError(f"Bilinmeyen yazma isteği: {kind}")
+        fut = Future()
+        self._q.put((kind, args, fut))
+        return fut
+
+    def close(self, timeout: float = 5.0):
+        self._q.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                self._q.put(None)  # kapanışı bu grup commit edildikten sonra işle
+                break
+            batch.append(item)
+        return batch
+
+    def _fail_queued(self, exc) -> bool:
+        """Kuyrukta bekleyen tüm istekleri hata ile sonuçlandırır; kapanış istenmişse True."""
+        stop = False
+        while True:
+            try:
+                item = self._q.get_nowait()
+            except queue.Empty:
+                return stop
+            if item is None:
+                stop = True
+            elif item[2].set_running_or_notify_cancel():
+                item[2].set_exception(exc)
+
+    def _run(self):
+        # Bağlantı ya da döngü beklenmedik şekilde çökerse thread ölmez: bekleyenler hata
+        # ile sonuçlandırılır, kısa bir aradan sonra yeni bağlantıyla devam edilir.
+        while True:
+            try:
+                conn = get_conn()
+                conn.isolation_level = None  # transaction sınırlarını elle yönetiyoruz
+            except Exception as e:
+                log.exception("DB yazıcısı bağlantı açamadı")
+                if self._fail_queued(e):
+                    return
+                time.sleep(1)
+                continue
+            try:
+                stop = self._serve(conn)
+            except Exception as e:
+                log.exception("DB yazıcısı döngüsü hata verdi; yeniden başlatılıyor")
+                stop = self._fail_queued(e)
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            if stop:
+                return
+
+    def _serve(self, conn) -> bool:
+        cur = conn.cursor()
+        while True:
+            first = self._q.get()
+            if first is None:
+                return True
+            batch = self._collect(first)
+            try:
+                self._commit_batch(conn, cur, batch)
+            except BaseException as e:
+                # Bu gruptaki çözülmemiş Future'lar hata alır, bağlantı yenilenir
+                for _, _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                raise
+
+    def _commit_batch(self, conn, cur, batch):
+        done = []
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            for kind, args, fut in batch:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                cur.execute("SAVEPOINT w")
+                try:
+                    result = _WRITE_HANDLERS[kind](cur, *args)
+                except Exception as e:
+                    cur.execute("ROLLBACK TO w")
+                    cur.execute("RELEASE w")
+                    fut.set_exception(e)
+                else:
+                    cur.execute("RELEASE w")
+                    done.append((fut, result))
+            cur.execute("COMMIT")
+        except sqlite3.Error as e:
+            # Grup commit edilemedi: hiçbir isteğin yazısı kalıcı olmadı
+            for fut, _ in done:
+                fut.set_exception(e)
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            if conn.in_transaction:
+                conn.rollback()  # başarısız olursa üst katman bağlantıyı yeniler
+            return
+        for fut, result in done:
+            fut.set_result(result)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer() -> DBWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = DBWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+def issue_scrap(harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial, created_by=None,
+                enforce_quota=True) -> Future:
+    """Kişiyi ekler/günceller ve koli kaydını yazar; Future sonucu yeni kayıt id'sidir.
+
+    enforce_quota ise limit kuralları yazma ile aynı transaction'da değerlendirilir ve
+    aşımda Future QuotaExceeded ile sonuçlanır. Form Seri No daha önce kaydedilmişse
+    DuplicateFormSerial ile sonuçlanır; zaman aşımından sonra tekrar gönderim çift kayıt açmaz.
+    """
+    return get_writer().submit("issue", harmony_ref, koli_sayisi, vardiya_amiri, depo,
+                               form_serial, created_by, enforce_quota)
+
+def upsert_person_minimal(harmony_ref, vardiya_amiri, depo) -> Future:
+    return get_writer().submit("upsert_person", harmony_ref, vardiya_amiri, depo)
+
+def import_personnel(rows) -> Future:
+    """rows: PERSONNEL_UPSERT_SQL sütun sırasında tuple listesi; Future sonucu satır sayısı."""
+    return get_writer().submit("import_personnel", list(rows))
+
+def create_user(username, password_hash, role) -> Future:
+    return get_writer().submit("create_user", username, password_hash, role)
+
+def open_session(nonce, user_id, expires_at) -> Future:
+    return get_writer().submit("open_session", nonce, user_id, expires_at)
+
+def close_session(nonce) -> Future:
+    return get_writer().submit("close_session", nonce)
+
+def update_password_hash(user_id, password_hash) -> Future:
+    return get_writer().submit("set_password_hash", user_id, password_hash)
+
+def save_quota_rules(rows) -> Future:
+    """Kural tablosunu verilen satırlarla eşitler (tek transaction)."""
+    rows = [tuple(r) for r in rows]
+    for r in rows:
+        if r[2] not in QUOTA_PERIODS:
+            raise ValueError(f"Geçersiz dönem: {r[2]}")
+        if r[2] == "rolling" and not r[3]:
+            raise ValueError(f"'{r[1]}' kuralı için gün sayısı gerekli.")
+        if r[4] is None or r[4] < 0:
+            raise ValueError(f"'{r[1]}' kuralı için azami koli 0 veya daha büyük olmalı.")
+        if r[2] == "once" and r[4] < 1:
+            raise ValueError(f"'{r[1]}': tek seferlik üst sınır en az 1 olmalı.")
+    return get_writer().submit("save_quota_rules", rows)
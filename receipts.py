@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+from reportlab.lib.pagesizes import A6
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import mm
+
+from db import DB_PATH, get_receipt_records
+
+# Kayıt id'leri veritabanına özgü olduğundan önbellek veritabanının yanında tutulur
+CACHE_DIR = DB_PATH.parent / "receipt_cache"
+CACHE_MAX_FILES = 500
+# Toplu basım istek thread'inde çalışır; sayfa sayısı sınırlı (500 sayfa ≈ 0,3 sn, 365 KB)
+BATCH_MAX_PAGES = 500
+
+_STATIC_FORM = "hkts_receipt_static"
+_FIELDS = ("id", "form_serial", "created_at", "harmony_ref", "koli_sayisi",
+           "vardiya_amiri", "depo", "created_by")
+
+WIDTH, HEIGHT = A6
+MARGIN = 8 * mm
+LINE_H = 6 * mm
+FIRST_LINE_Y = HEIGHT - MARGIN - 10 * mm
+FOOTER_Y = FIRST_LINE_Y - 7 * LINE_H
+
+def _draw_static(c):
+    """Her fişte aynı olan başlık bandı ve alt bilgi (form XObject olarak bir kez çizilir)."""
+    c.setFillColorRGB(0.12, 0.35, 1.0)
+    c.rect(0, HEIGHT-18*mm, WIDTH, 18*mm, fill=1, stroke=0)
+    c.setFillColorRGB(1,1,1)
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(MARGIN, HEIGHT-12*mm, "LC Waikiki - Hurda Koli Fişi")
+
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("Helvetica-Oblique", 9)
+    c.drawString(MARGIN, FOOTER_Y, "Bu fiş sistem tarafından otomatik üretilmiştir.")
+
+def _draw_record(c, record: dict):
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("Helvetica", 10)
+    lines = [
+        ("Form Seri No", record["form_serial"]),
+        ("Tarih", record["created_at"]),
+        ("Harmony Ref", record["harmony_ref"]),
+        ("Koli Sayısı", str(record["koli_sayisi"])),
+        ("Vardiya Amiri", record["vardiya_amiri"]),
+        ("Depo", record["depo"]),
+        ("Kaydı Giren", record.get("created_by") or "-"),
+    ]
+    y = FIRST_LINE_Y
+    for label, value in lines:
+        c.drawString(MARGIN, y, f"{label}: {value}")
+        y -= LINE_H
+
+def render_receipts(records) -> bytes:
+    """Kayıt listesinden tek PDF üretir; her kayıt bir A6 sayfa.
+
+    Sabit başlık/alt bilgi belgede bir kez form XObject olarak tanımlanıp her sayfada
+    yeniden kullanılır, böylece toplu basımda sayfa başına yalnızca değişken satırlar çizilir.
+    """
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A6)
+    c.beginForm(_STATIC_FORM)
+    _draw_static(c)
+    c.endForm()
+    for record in records:
+        c.doForm(_STATIC_FORM)
+        _draw_record(c, record)
+        c.showPage()
+    c.save()
+    pdf = buf.getvalue()
+    buf.close()
+    return pdf
+
+def make_receipt_pdf(record: dict) -> bytes:
+    return render_receipts([record])
+
+# ---------- disk önbelleği (kayıt id + içerik özeti, LRU)
+def _cache_path(record: dict) -> Path:
+    payload = json.dumps({k: str(record.get(k) or "") for k in _FIELDS}, sort_keys=True)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+    return CACHE_DIR / f"{record['id']}_{digest}.pdf"
+
+def _mtime(p: Path) -> float:
+    try:
+        return p.stat().st_mtime
+    except OSError:
+        return 0.0
+
+def _evict():
+    files = sorted(CACHE_DIR.glob("*.pdf"), key=_mtime)
+    for p in files[:max(0, len(files) - CACHE_MAX_FILES)]:
+        try:
+            p.unlink()
+        except OSError:
+            pass
+
+def receipt_pdf(record: dict) -> bytes:
+    """Önbellekten fiş döner; yoksa üretip diske yazar. Kayıt içeriği değişirse anahtar da değişir."""
+    path = _cache_path(record)
+    try:
+        pdf = path.read_bytes()
+    except OSError:
+        pass
+    else:
+        try:
+            os.utime(path)  # LRU: son erişim zamanını güncelle
+        except OSError:
+            pass
+        return pdf
+
+    pdf = make_receipt_pdf(record)
+    # Oturumlar aynı süreçte thread olduğundan geçici dosya adı thread'e özgü olmalı.
+    # Önbelleğe yazılamaması hata değildir; fiş yine döner, sonraki istekte tekrar denenir.
+    tmp = None
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        for stale in CACHE_DIR.glob(f"{record['id']}_*.pdf"):
+            if stale != path:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+        with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix=".tmp", delete=False) as f:
+            tmp = f.name
+            f.write(pdf)
+        os.replace(tmp, path)
+        tmp = None
+        _evict()
+    except OSError:
+        pass
+    finally:
+        if tmp:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+    return pdf
+
+def receipt_for_id(record_id: int):
+    """Geçmiş kayıt için fişi (yeniden) basar. Kayıt yoksa None."""
+    records = get_receipt_records([record_id])
+    return receipt_pdf(records[0]) if records else None
+
+def batch_receipts_pdf(record_ids) -> bytes:
+    """Birden çok kaydın fişlerini tek, çok sayfalı PDF olarak üretir (ör. bir vardiyanın tüm kayıtları).
+    Bulunamayan id'ler atlanır; BATCH_MAX_PAGES'ten fazla kayıt ValueError verir."""
+    record_ids = list(record_ids)
+    if len(record_ids) > BATCH_MAX_PAGES:
+        raise ValueError(f"Toplu fiş en fazla {BATCH_MAX_PAGES} kayıt için üretilebilir ({len(record_ids)} seçildi).")
+    return render_receipts(get_receipt_records(record_ids))
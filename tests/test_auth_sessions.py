@@ -0,0 +1,59 @@
+import pytest
+
+import auth
+import db
+
+
+@pytest.fixture
+def user(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "hkts.db")
+    monkeypatch.setattr(auth, "_secret", b"test-secret")
+    monkeypatch.setattr(auth, "pwd_context", auth.make_context(1000))
+    db.init_db()
+    # Yazıcı bağlantısı bu testin veritabanına açılsın
+    writer = db.DBWriter()
+    monkeypatch.setattr(db, "_writer", writer)
+    ok, msg = auth.register_user("gate.user", "sifre123", "security")
+    assert ok, msg
+    ok, user = auth.authenticate("gate.user", "sifre123", "security")
+    assert ok, user
+    yield user
+    writer.close()
+
+
+def test_token_resumes_until_logout(user):
+    token = auth.issue_session_token(user)
+    assert auth.resume_session(token) == user
+
+    assert auth.revoke_session(token)
+    # Geçmişten açılan URL'deki jeton artık oturum açmaz
+    assert auth.resume_session(token) is None
+
+
+def test_logout_revokes_only_that_session(user):
+    gate1 = auth.issue_session_token(user)
+    gate2 = auth.issue_session_token(user)
+    auth.revoke_session(gate1)
+    assert auth.resume_session(gate1) is None
+    assert auth.resume_session(gate2) == user
+
+
+def test_password_reset_and_tampering_invalidate_token(user):
+    token = auth.issue_session_token(user)
+    assert auth.resume_session(token[:-2] + "xx") is None
+    auth.reset_password("gate.user")
+    assert auth.resume_session(token) is None
+
+
+def test_rehash_on_login_when_policy_changes(user, monkeypatch):
+    def stored():
+        conn = db.get_conn()
+        h = conn.execute("SELECT password_hash FROM users WHERE id=?", (user["id"],)).fetchone()[0]
+        conn.close()
+        return h
+
+    before = stored()
+    monkeypatch.setattr(auth, "pwd_context", auth.make_context(2000))
+    ok, _ = auth.authenticate("gate.user", "sifre123", "security")
+    assert ok
+    assert stored() != before and "$2000$" in stored()
@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "hkts.db")
+    db.init_db()
+    return tmp_path / "hkts.db"
+
+
+@pytest.fixture
+def writer(fresh_db):
+    # Uzun max_wait: art arda gönderilen istekler aynı gruba düşsün
+    w = db.DBWriter(max_batch=64, max_wait=0.2)
+    yield w
+    w.close()
+
+
+def _count(sql, *params):
+    conn = db.get_conn()
+    n = conn.execute(sql, params).fetchone()[0]
+    conn.close()
+    return n
+
+
+def _personnel_row(ref, extra=()):
+    return (ref,) + ("",) * 23 + tuple(extra)
+
+
+def test_failing_request_rolls_back_only_its_savepoint(writer):
+    ok1 = writer.submit("issue", "A", 3, "Amir", "Lm Depo", "F1", "u", True)
+    # executemany ilk satırı yazdıktan sonra ikinci satırda hata verir
+    bad = writer.submit("import_personnel", [_personnel_row("P1"), _personnel_row("P2", ("fazla",))])
+    over = writer.submit("issue", "B", 99, "Amir", "Lm Depo", "F2", "u", True)
+    ok2 = writer.submit("upsert_person", "C", "Amir", "Lm Depo")
+
+    assert isinstance(ok1.result(timeout=5), int)
+    with pytest.raises(sqlite3.Error):
+        bad.result(timeout=5)
+    with pytest.raises(db.QuotaExceeded):
+        over.result(timeout=5)
+    ok2.result(timeout=5)
+
+    assert _count("SELECT COUNT(*) FROM scrap_records") == 1
+    assert _count("SELECT COUNT(*) FROM personnel WHERE harmony_ref IN ('P1','P2')") == 0
+    assert _count("SELECT COUNT(*) FROM personnel WHERE harmony_ref IN ('A','C')") == 2
+
+
+def test_concurrent_issues_cannot_exceed_quota(writer):
+    def issue(i):
+        try:
+            return writer.submit("issue", "R", 10, "Amir", "Lm Depo", f"F{i}", "u", True).result(timeout=10)
+        except db.QuotaExceeded:
+            return None
+
+    with ThreadPoolExecutor(32) as ex:
+        results = list(ex.map(issue, range(50)))
+
+    # Varsayılan kurallar: son 365 günde 45 koli -> 10'luk 4 istek geçer
+    assert sum(r is not None for r in results) == 4
+    assert _count("SELECT SUM(koli_sayisi) FROM scrap_records WHERE harmony_ref='R'") == 40
+
+
+def test_commit_failure_fails_every_future_in_group_and_writer_recovers(fresh_db, monkeypatch):
+    real_get_conn = db.get_conn
+
+    def fk_conn():
+        conn = real_get_conn()
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def defer_fk_violation(cur):
+        # FK denetimi COMMIT'e ertelenir; COMMIT başarısız olur
+        cur.execute("PRAGMA defer_foreign_keys=ON")
+        cur.execute("INSERT INTO scrap_records(harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial) "
+                    "VALUES('YOK', 1, 'A', 'D', 'F')")
+
+    monkeypatch.setattr(db, "get_conn", fk_conn)
+    monkeypatch.setitem(db._WRITE_HANDLERS, "defer_fk_violation", defer_fk_violation)
+    w = db.DBWriter(max_wait=0.2)
+    try:
+        good = w.submit("upsert_person", "OK1", "Amir", "Lm Depo")
+        bad = w.submit("defer_fk_violation")
+        with pytest.raises(sqlite3.IntegrityError):
+            good.result(timeout=5)
+        with pytest.raises(sqlite3.IntegrityError):
+            bad.result(timeout=5)
+        assert _count("SELECT COUNT(*) FROM personnel") == 0
+
+        # Sonraki grup normal şekilde commit edilir
+        w.submit("upsert_person", "OK2", "Amir", "Lm Depo").result(timeout=5)
+        assert _count("SELECT COUNT(*) FROM personnel WHERE harmony_ref='OK2'") == 1
+    finally:
+        w.close()
+
+
+def test_connection_failure_fails_pending_futures_instead_of_hanging(fresh_db, monkeypatch):
+    real_get_conn = db.get_conn
+    calls = {"n": 0}
+    gate = threading.Event()
+
+    def flaky_conn():
+        calls["n"] += 1
+        if calls["n"] == 1:
+            gate.wait(5)  # ilk istek kuyruğa girene kadar bekle
+            raise sqlite3.OperationalError("unable to open database file")
+        return real_get_conn()
+
+    monkeypatch.setattr(db, "get_conn", flaky_conn)
+    w = db.DBWriter()
+    try:
+        fut = w.submit("upsert_person", "X", "Amir", "Lm Depo")
+        gate.set()
+        with pytest.raises(sqlite3.OperationalError):
+            fut.result(timeout=5)
+        # Thread ayakta kalır ve yeni bağlantıyla devam eder
+        w.submit("upsert_person", "Y", "Amir", "Lm Depo").result(timeout=5)
+        assert _count("SELECT COUNT(*) FROM personnel WHERE harmony_ref='Y'") == 1
+    finally:
+        w.close()
+
+
+def test_duplicate_form_serial_is_rejected(writer):
+    first = writer.submit("issue", "D", 2, "Amir", "Lm Depo", "FSN-1", "u", True)
+    retry = writer.submit("issue", "D", 2, "Amir", "Lm Depo", "FSN-1", "u", True)
+    rec_id = first.result(timeout=5)
+    with pytest.raises(db.DuplicateFormSerial, match=f"kayıt no {rec_id}"):
+        retry.result(timeout=5)
+    assert _count("SELECT COUNT(*) FROM scrap_records WHERE form_serial='FSN-1'") == 1
+
+
+def test_cancelled_issue_is_not_written(fresh_db, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def block(cur):
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setitem(db._WRITE_HANDLERS, "block", block)
+    w = db.DBWriter(max_batch=1)
+    try:
+        w.submit("block")
+        assert started.wait(5)
+        # Yazıcı meşgulken zaman aşımına uğrayan çağıran isteği geri çeker
+        fut = w.submit("issue", "C", 1, "Amir", "Lm Depo", "FSN-2", "u", True)
+        assert fut.cancel()
+        release.set()
+        w.submit("upsert_person", "Z", "Amir", "Lm Depo").result(timeout=5)
+        assert _count("SELECT COUNT(*) FROM scrap_records") == 0
+    finally:
+        release.set()
+        w.close()
@@ -0,0 +1,151 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "hkts.db")
+    db.init_db()
+    w = db.DBWriter()
+    monkeypatch.setattr(db, "_writer", w)
+    yield w
+    w.close()
+
+
+@pytest.fixture
+def istanbul_tz(monkeypatch):
+    # UTC+3: yerel ay başı UTC'de bir önceki ayın son günü 21:00'dir
+    monkeypatch.setenv("TZ", "Europe/Istanbul")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _rule_count():
+    conn = db.get_conn()
+    n = conn.execute("SELECT COUNT(*) FROM quota_rules").fetchone()[0]
+    conn.close()
+    return n
+
+
+def test_defaults_seeded_only_when_table_is_created(writer):
+    assert _rule_count() == 2
+    db.save_quota_rules([]).result(timeout=5)
+    db.init_db()
+    assert _rule_count() == 0
+
+
+def test_report_uses_same_rules_as_issuance(writer):
+    db.save_quota_rules([
+        (1, "Tek Sefer", "once", None, 15, None, None, 1),
+        (2, "Yıllık", "rolling", 365, 45, None, None, 1),
+        (None, "Aylık", "month", None, 5, None, None, 1),
+    ]).result(timeout=5)
+    db.issue_scrap("P1", 5, "Amir", "Lm Depo", "F1").result(timeout=5)
+    with pytest.raises(db.QuotaExceeded, match="Aylık"):
+        db.issue_scrap("P1", 1, "Amir", "Lm Depo", "F2").result(timeout=5)
+
+    row = db.quota_report().set_index("harmony_ref").loc["P1"]
+    assert row["kural"] == "Aylık"
+    assert row["kalan"] == 0
+    assert row["durum"] == "Limit Doldu"
+    assert row["engelleyen_kurallar"] == "Aylık"
+
+
+def test_report_applies_warehouse_rule_to_last_warehouse(writer):
+    db.save_quota_rules([
+        (2, "Yıllık", "rolling", 365, 45, None, None, 1),
+        (None, "Yalova Aylık", "month", None, 10, "Yalova Depo", None, 1),
+    ]).result(timeout=5)
+    db.issue_scrap("Y1", 8, "Amir", "Yalova Depo", "F1").result(timeout=5)
+    db.issue_scrap("L1", 8, "Amir", "Lm Depo", "F2").result(timeout=5)
+
+    report = db.quota_report(near_ratio=0.8).set_index("harmony_ref")
+    assert report.loc["Y1", "kural"] == "Yalova Aylık" and report.loc["Y1", "kalan"] == 2
+    assert report.loc["Y1", "durum"] == "Sınıra Yakın"
+    assert report.loc["L1", "kural"] == "Yıllık" and report.loc["L1", "kalan"] == 37
+
+    only_yalova = db.quota_report(depos=["Yalova Depo"])
+    assert only_yalova["harmony_ref"].tolist() == ["Y1"]
+
+
+def test_report_picks_tightest_rule_and_latest_record(writer):
+    db.save_quota_rules([
+        (None, "Aylık", "month", None, 10, None, None, 1),
+        (None, "Yıllık", "year", None, 10, None, None, 1),
+        (None, "Lm Aylık", "month", None, 4, "Lm Depo", None, 1),
+    ]).result(timeout=5)
+    conn = db.get_conn()
+    conn.executemany(
+        "INSERT INTO scrap_records(harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial, created_at) "
+        "VALUES('T1', 5, ?, ?, 'F', datetime('now', ?))",
+        [("Eski Amir", "Yalova Depo", "-2 seconds"), ("Yeni Amir", "Lm Depo", "-1 seconds")])
+    conn.commit()
+    conn.close()
+
+    row = db.quota_report().set_index("harmony_ref").loc["T1"]
+    # Son kayıt Lm Depo'da: depo kuralı uygulanır; üçü de dolu, oranı en yüksek olan gösterilir
+    assert (row["vardiya_amiri"], row["depo"]) == ("Yeni Amir", "Lm Depo")
+    assert row["kural"] == "Lm Aylık" and row["kullanim_orani"] == 1.25
+    assert row["engelleyen_kurallar"] == "Aylık, Yıllık, Lm Aylık"
+
+
+@pytest.mark.parametrize("row, message", [
+    ((None, "Sıfır", "once", None, 0, None, None, 1), "en az 1"),
+    ((None, "Negatif", "month", None, -1, None, None, 1), "0 veya daha büyük"),
+    ((None, "Günsüz", "rolling", None, 5, None, None, 1), "gün sayısı"),
+])
+def test_save_rejects_invalid_rules(writer, row, message):
+    with pytest.raises(ValueError, match=message):
+        db.save_quota_rules([row])
+
+
+def test_save_rejects_unknown_warehouse(writer):
+    with pytest.raises(ValueError, match="LM Depo"):
+        db.save_quota_rules([(None, "Yazım", "month", None, 5, "LM Depo", None, 1)]).result(timeout=5)
+    assert _rule_count() == 2
+
+
+def test_evaluate_quota_is_one_statement(writer):
+    db.save_quota_rules([
+        (None, f"K{i}", "rolling", 30 + i, 50, None, None, 1) for i in range(20)
+    ]).result(timeout=5)
+    conn = db.get_conn()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    result = db.evaluate_quota("P1", "Lm Depo", conn=conn)
+    conn.close()
+    assert len(result) == 20
+    assert len(statements) == 1
+
+
+def test_month_window_uses_local_month_start_under_non_utc_tz(writer, istanbul_tz):
+    db.save_quota_rules([(None, "Aylık", "month", None, 5, None, None, 1)]).result(timeout=5)
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def utc(local):
+        return local.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    conn = db.get_conn()
+    conn.executemany(
+        "INSERT INTO scrap_records(harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial, created_at) "
+        "VALUES('TZ1', ?, 'Amir', 'Lm Depo', 'F', ?)",
+        # Yerel ayın ilk dakikası (UTC'de önceki ay) sayılır; önceki yerel ayın son dakikası sayılmaz
+        [(4, utc(month_start + timedelta(minutes=1))), (3, utc(month_start - timedelta(minutes=1)))])
+    conn.execute("INSERT INTO personnel(harmony_ref) VALUES('TZ1')")
+    conn.commit()
+    conn.close()
+
+    assert db.evaluate_quota("TZ1")[0]["used"] == 4
+    with pytest.raises(db.QuotaExceeded):
+        db.issue_scrap("TZ1", 2, "Amir", "Lm Depo", "F2").result(timeout=5)
+
+    row = db.quota_report().set_index("harmony_ref").loc["TZ1"]
+    assert row["kullanilan"] == 4
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    assert row["hak_acilis_tarihi"] == next_month.strftime("%Y-%m-%d")
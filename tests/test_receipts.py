@@ -0,0 +1,89 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import db
+import receipts
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "hkts.db")
+    monkeypatch.setattr(receipts, "CACHE_DIR", tmp_path / "receipt_cache")
+    db.init_db()
+    writer = db.DBWriter()
+    monkeypatch.setattr(db, "_writer", writer)
+    yield receipts.CACHE_DIR
+    writer.close()
+
+
+def _record(i, **changes):
+    r = {"id": i, "form_serial": f"F{i}", "created_at": "2026-01-05 10:00:00", "harmony_ref": f"H{i}",
+         "koli_sayisi": 3, "vardiya_amiri": "Amir", "depo": "Lm Depo", "created_by": "u"}
+    r.update(changes)
+    return r
+
+
+def _files(cache_dir):
+    return sorted(p.name for p in cache_dir.iterdir())
+
+
+def _pages(pdf):
+    return len(re.findall(rb"/Type /Page\b", pdf))
+
+
+def test_key_follows_content_and_stale_file_is_removed(cache):
+    receipts.receipt_pdf(_record(1))
+    before = _files(cache)
+    pdf = receipts.receipt_pdf(_record(1, koli_sayisi=9))
+    after = _files(cache)
+    assert len(before) == len(after) == 1
+    assert before != after and after[0].startswith("1_")
+    assert (cache / after[0]).read_bytes() == pdf
+
+
+def test_least_recently_used_file_is_evicted(cache, monkeypatch):
+    monkeypatch.setattr(receipts, "CACHE_MAX_FILES", 3)
+    for i in (1, 2, 3):
+        receipts.receipt_pdf(_record(i))
+    # Sabit, farklı erişim zamanları: 1 en eski
+    for age, name in enumerate(reversed(_files(cache))):
+        os.utime(cache / name, (1_000_000 - age, 1_000_000 - age))
+    receipts.receipt_pdf(_record(1))  # önbellekten okuma 1'i tazeler, en eski artık 2
+    receipts.receipt_pdf(_record(4))
+    assert [n.split("_")[0] for n in _files(cache)] == ["1", "3", "4"]
+
+
+def test_receipt_for_missing_id_is_none(cache):
+    assert receipts.receipt_for_id(12345) is None
+    assert not cache.exists() or _files(cache) == []
+
+
+def test_batch_skips_missing_ids_and_is_capped(cache, monkeypatch):
+    ids = [db.issue_scrap(f"B{i}", 1, "Amir", "Lm Depo", f"FB{i}").result(timeout=5) for i in range(2)]
+    pdf = receipts.batch_receipts_pdf([ids[1], 999, ids[0]])
+    assert pdf.startswith(b"%PDF") and _pages(pdf) == 2
+
+    monkeypatch.setattr(receipts, "BATCH_MAX_PAGES", 2)
+    with pytest.raises(ValueError, match="en fazla 2"):
+        receipts.batch_receipts_pdf(ids + [999])
+
+
+def test_concurrent_misses_all_return_pdfs(cache):
+    records = [_record(i) for i in range(40)]
+    start = threading.Barrier(8)
+
+    def worker(_):
+        start.wait(5)
+        # Her thread aynı kayıtları ister: aynı dosyaya eşzamanlı yazma yarışı
+        return [receipts.receipt_pdf(r) for r in records]
+
+    with ThreadPoolExecutor(8) as ex:
+        results = list(ex.map(worker, range(8)))
+
+    assert all(pdf.startswith(b"%PDF") and _pages(pdf) == 1 for batch in results for pdf in batch)
+    names = _files(cache)
+    assert len(names) == 40 and not any(n.endswith(".tmp") for n in names)
@@ -0,0 +1,78 @@
+"""Giriş hızı ölçümü: authenticate (şifre doğrulama) ve resume_session (jetonla devam).
+
+Her --rounds değeri için geçici veritabanında bir kullanıcı oluşturulur ve saniyedeki
+giriş sayısı tek/çok thread ile ölçülür. Politika değişimindeki rehash de doğrulanır:
+ilk tur sayısıyla oluşturulan hash, sonraki politikayla girişte güncellenmelidir.
+
+Kullanım:
+    python tools/bench_login.py --rounds 29000 100000 --threads 8 --seconds 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def _rate(fn, seconds: float, threads: int) -> float:
+    """seconds boyunca fn'i threads paralel döngüde çağırır; çağrı/sn döner."""
+    deadline = time.perf_counter() + seconds
+
+    def loop():
+        n = 0
+        while time.perf_counter() < deadline:
+            fn()
+            n += 1
+        return n
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        total = sum(f.result() for f in [ex.submit(loop) for _ in range(threads)])
+    return total / (time.perf_counter() - t0)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rounds", type=int, nargs="+", default=[29000])
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    args = ap.parse_args(argv)
+
+    os.environ["HKTS_DB_PATH"] = str(Path(tempfile.mkdtemp(prefix="hkts_bench_")) / "hkts.db")
+    os.environ.setdefault("HKTS_SESSION_SECRET", "bench")
+    sys.path.insert(0, str(ROOT))
+    import auth
+    from db import init_db, get_conn
+
+    init_db()
+    password = "bench-Sifre-123"
+    conn = get_conn()
+    conn.execute("INSERT INTO users(username, password_hash, role) VALUES(?,?,?)",
+                 ("bench", auth.make_context(args.rounds[0]).hash(password), "security"))
+    conn.commit(); conn.close()
+
+    def stored_hash():
+        conn = get_conn()
+        h = conn.execute("SELECT password_hash FROM users WHERE username='bench'").fetchone()[0]
+        conn.close()
+        return h
+
+    print(f"{'rounds':>8}{'threads':>9}{'giriş/sn':>12}{'devam/sn':>12}  rehash")
+    for rounds in args.rounds:
+        auth.pwd_context = auth.make_context(rounds)
+        before = stored_hash()
+        ok, user = auth.authenticate("bench", password, "security")
+        assert ok, user
+        rehashed = stored_hash() != before
+        token = auth.issue_session_token(user)
+        assert auth.resume_session(token) is not None
+
+        for threads in sorted({1, args.threads}):
+            logins = _rate(lambda: auth.authenticate("bench", password, "security"), args.seconds, threads)
+            resumes = _rate(lambda: auth.resume_session(token), args.seconds, threads)
+            print(f"{rounds:>8}{threads:>9}{logins:>12.1f}{resumes:>12.1f}  {'evet' if rehashed else '-'}")
+
+if __name__ == "__main__":
+    main()
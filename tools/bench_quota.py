@@ -0,0 +1,96 @@
+"""Limit kuralları motoru ölçümü: kural sayısı arttıkça evaluate_quota süresi ve sorgu sayısı.
+
+Geçici veritabanına --people kişi ve kişi başına --records kayıt yüklenir; ardından her
+--rules değeri için o kadar kural (dönem / depo / görev karışık) tanımlanıp rastgele
+kişiler için evaluate_quota çağrılır. Çağrı başına çalıştırılan SQL sayısı
+(set_trace_callback ile) kural sayısından bağımsız olarak 1 kalmalıdır. Sonda son kural
+setiyle tüm kişiler için Limit Raporu (quota_usage) süresi ölçülür.
+
+Kullanım:
+    python tools/bench_quota.py --rules 2 10 50 200 --calls 2000
+    python tools/bench_quota.py --people 20000 --records 10 --rules 3 --calls 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rules", type=int, nargs="+", default=[2, 10, 50, 200])
+    ap.add_argument("--people", type=int, default=5000)
+    ap.add_argument("--records", type=int, default=6, help="kişi başına kayıt")
+    ap.add_argument("--calls", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    random.seed(args.seed)
+    os.environ["HKTS_DB_PATH"] = str(Path(tempfile.mkdtemp(prefix="hkts_bench_")) / "hkts.db")
+    sys.path.insert(0, str(ROOT))
+    from db import init_db, get_conn, evaluate_quota, quota_usage
+
+    init_db()
+    conn = get_conn()
+    depos = [r["name"] for r in conn.execute("SELECT name FROM warehouses")]
+    roles = ["Toplayıcı", "Paketleyici", "Forklift", "Sevkiyat"]
+    now = datetime.now(timezone.utc)  # created_at UTC saklanır
+    conn.executemany("INSERT INTO personnel(harmony_ref, gorevi, depo) VALUES(?,?,?)",
+                     [(f"B{i:06d}", random.choice(roles), random.choice(depos)) for i in range(args.people)])
+    conn.executemany(
+        "INSERT INTO scrap_records(harmony_ref, koli_sayisi, vardiya_amiri, depo, form_serial, created_at) "
+        "VALUES(?,?,?,?,?,?)",
+        [(f"B{i:06d}", random.randint(1, 10), "Bench", random.choice(depos), "BENCH",
+          (now - timedelta(days=random.randint(0, 500))).strftime("%Y-%m-%d %H:%M:%S"))
+         for i in range(args.people) for _ in range(args.records)])
+    conn.commit()
+
+    print(f"{args.people} kişi, {args.people * args.records} kayıt")
+    print(f"{'kural':>6}{'uygulanan':>11}{'sorgu/çağrı':>13}{'p50 ms':>9}{'p99 ms':>9}{'ort ms':>9}")
+    for n_rules in args.rules:
+        conn.execute("DELETE FROM quota_rules")
+        rules = []
+        for i in range(n_rules):
+            period = random.choice(["once", "rolling", "month", "year"])
+            rules.append((f"K{i}", period, random.choice([30, 90, 365]) if period == "rolling" else None,
+                          random.randint(10, 60),
+                          random.choice(depos) if random.random() < 0.5 else None,
+                          random.choice(roles) if random.random() < 0.3 else None))
+        conn.executemany("INSERT INTO quota_rules(name, period, days, max_koli, depo, gorevi) "
+                         "VALUES(?,?,?,?,?,?)", rules)
+        conn.commit()
+
+        statements = []
+        conn.set_trace_callback(statements.append)
+        lat, applied = [], []
+        for _ in range(args.calls):
+            ref, depo = f"B{random.randrange(args.people):06d}", random.choice(depos)
+            t0 = time.perf_counter()
+            res = evaluate_quota(ref, depo, conn=conn)
+            lat.append(time.perf_counter() - t0)
+            applied.append(len(res))
+        conn.set_trace_callback(None)
+
+        print(f"{n_rules:>6}{statistics.fmean(applied):>11.1f}{len(statements) / args.calls:>13.2f}"
+              f"{_pct(lat, 50) * 1000:>9.3f}{_pct(lat, 99) * 1000:>9.3f}{statistics.fmean(lat) * 1000:>9.3f}")
+    conn.close()
+
+    lat = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        n = len(quota_usage())
+        lat.append(time.perf_counter() - t0)
+    print(f"limit raporu: {n} kişi, en iyi {min(lat) * 1000:.0f} ms, ort {statistics.fmean(lat) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
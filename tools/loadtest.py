@@ -0,0 +1,421 @@
+"""Vardiya değişimi yükünü yerelde üreten eşzamanlı oturum testi.
+
+Gerçek bir `streamlit run app.py` sunucusu başlatılır ve N başsız istemci, tarayıcının
+yaptığı gibi websocket üzerinden bağlanıp widget durumlarını göndererek oturum açar;
+ardından Koli Ver / Kayıtlar / Raporlar işlemlerini karışık sırayla tekrarlar. Her
+işlemin süresi, isteğin gönderilmesinden betiğin sunucuda bitmesine (script_finished)
+kadar ölçülür. Sonda işlem gecikme yüzdelikleri, hata ve "database is locked" oranları
+ile DB / WAL dosya büyümesi raporlanır.
+
+Tüm oturumlar tek sunucu sürecinde çalıştığından yazmalar üretimdeki gibi tek DB
+yazıcısından geçer; sonuçlar veri katmanı değişikliklerini karşılaştırmak için
+kullanılabilir. İstemciler aynı makinede koştuğundan CPU sunucu ile paylaşılır.
+
+Kullanım:
+    python tools/loadtest.py --sessions 30 --iterations 20
+    python tools/loadtest.py --db /tmp/hkts_load.db --json sonuc.json
+    python tools/loadtest.py --url http://localhost:8501   # çalışan sunucuya karşı
+
+Varsayılan olarak geçici bir veritabanı kullanılır; gerçek hkts.db'ye dokunulmaz.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.NumberInput_pb2 import NumberInput
+from tornado.websocket import websocket_connect
+
+ROOT = Path(__file__).resolve().parent.parent
+APP = ROOT / "app.py"
+
+ACTIONS = {"koli_ver": 0.5, "kayitlar": 0.3, "raporlar": 0.2}
+
+def _file_size(p: Path) -> int:
+    try:
+        return p.stat().st_size
+    except OSError:
+        return 0
+
+def _db_sizes(db_path: Path):
+    return _file_size(db_path), _file_size(Path(f"{db_path}-wal"))
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock_errors = defaultdict(int)
+        self.runs = defaultdict(int)
+        self.samples = []
+
+    def add(self, action, seconds, error=None):
+        self.runs[action] += 1
+        self.latency[action].append(seconds)
+        if error:
+            self.errors[action] += 1
+            if len(self.samples) < 5:
+                self.samples.append(f"{action}: {error[:200]}")
+            if any(k in error.lower() for k in ("locked", "busy", "zamanında yanıt vermedi", "geç yanıt")):
+                self.lock_errors[action] += 1
+
+class ServerSession:
+    """Tek tarayıcı sekmesini taklit eden websocket istemcisi.
+
+    Sunucu her çalıştırmada ekrandaki öğeleri gönderir; widget'lar (tür, etiket) ile bulunur
+    ve sonraki rerun'da tarayıcı gibi tüm bilinen değerler gönderilir. Düğmeler yalnızca
+    tıklandıkları rerun'da tetiklenir.
+    """
+
+    WIDGETS = ("radio", "selectbox", "text_input", "number_input", "button", "multiselect",
+               "checkbox", "slider")
+
+    def __init__(self, url: str, timeout: float):
+        self.ws_url = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        self.timeout = timeout
+        self.query_string = ""
+        self.values = {}    # (tür, etiket) -> değer; sonraki rerun'larda da gönderilir
+        self.widgets = {}   # (tür, etiket) -> son çalıştırmadaki widget protosu
+        self.alerts = []    # (Alert.Format, metin)
+        self.exceptions = []
+        self._cache = {}    # sunucu büyük mesajları tekrarında yalnızca hash ile gönderir
+        self.ws = None
+
+    async def connect(self):
+        self.ws = await websocket_connect(self.ws_url)
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    def set(self, kind, label, value):
+        self.values[(kind, label)] = value
+
+    def has(self, kind, label):
+        return (kind, label) in self.widgets
+
+    def errors(self):
+        return [text for fmt, text in self.alerts if fmt == Alert.ERROR]
+
+    def warnings(self):
+        return [text for fmt, text in self.alerts if fmt == Alert.WARNING]
+
+    def successes(self):
+        return [text for fmt, text in self.alerts if fmt == Alert.SUCCESS]
+
+    def _state(self, el, kind, value, ws):
+        ws.id = el.id
+        if kind == "button":
+            ws.trigger_value = bool(value)
+        elif kind in ("radio", "selectbox"):
+            ws.int_value = value if isinstance(value, int) else list(el.options).index(value)
+        elif kind == "multiselect":
+            ws.int_array_value.data[:] = [list(el.options).index(v) for v in value]
+        elif kind == "text_input":
+            ws.string_value = value
+        elif kind == "number_input":
+            if el.data_type == NumberInput.INT:
+                ws.int_value = int(value)
+            else:
+                ws.double_value = float(value)
+        elif kind == "checkbox":
+            ws.bool_value = bool(value)
+        elif kind == "slider":
+            ws.double_array_value.data[:] = list(value) if isinstance(value, (list, tuple)) else [value]
+
+    async def rerun(self, click=None):
+        """Bilinen widget değerleriyle betiği yeniden çalıştırır; click etiketli düğme tetiklenir."""
+        msg = BackMsg()
+        msg.rerun_script.query_string = self.query_string
+        states = msg.rerun_script.widget_states
+        pending = dict(self.values)
+        if click is not None:
+            pending[("button", click)] = True
+        for (kind, label), value in pending.items():
+            el = self.widgets.get((kind, label))
+            if el is not None:
+                self._state(el, kind, value, states.widgets.add())
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        await asyncio.wait_for(self._read_run(), self.timeout)
+
+    async def _read_run(self):
+        self.widgets, self.alerts, self.exceptions = {}, [], []
+        while True:
+            raw = await self.ws.read_message()
+            if raw is None:
+                raise ConnectionError("sunucu bağlantıyı kapattı")
+            fm = ForwardMsg()
+            fm.ParseFromString(raw)
+            if fm.ref_hash:
+                fm = self._cache[fm.ref_hash]
+            elif fm.metadata.cacheable:
+                self._cache[fm.hash] = fm
+            kind = fm.WhichOneof("type")
+            if kind == "page_info_changed":
+                self.query_string = fm.page_info_changed.query_string
+            elif kind == "script_finished":
+                # st.rerun ile kesilen çalıştırmanın ardından yenisi gelir
+                if fm.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return
+            elif kind == "delta" and fm.delta.WhichOneof("type") == "new_element":
+                el_kind = fm.delta.new_element.WhichOneof("type")
+                el = getattr(fm.delta.new_element, el_kind)
+                if el_kind in self.WIDGETS:
+                    self.widgets.setdefault((el_kind, el.label), el)
+                elif el_kind == "alert":
+                    self.alerts.append((el.format, el.body))
+                elif el_kind == "exception":
+                    self.exceptions.append(f"{el.type}: {el.message}")
+
+class Session:
+    """Tek kullanıcının işlem akışı; her adım bir kullanıcı işlemi ve süresi ölçülür."""
+
+    def __init__(self, stats: Stats, url: str, username: str, password: str, people: int,
+                 timeout: float):
+        self.stats = stats
+        self.url = url
+        self.username = username
+        self.password = password
+        self.people = people
+        self.timeout = timeout
+        self.client = ServerSession(url, timeout)
+
+    async def _step(self, action, fn):
+        t0 = time.perf_counter()
+        error = None
+        try:
+            await fn()
+            if self.client.exceptions:
+                error = "; ".join(self.client.exceptions)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.stats.add(action, time.perf_counter() - t0, error)
+        return error is None
+
+    async def _goto(self, page):
+        self.client.set("radio", "Modüller", page)
+        await self.client.rerun()
+
+    async def login(self):
+        # Isınma ölçüme girmez: bağlantı ve giriş ekranının ilk çizimi
+        await self.client.connect()
+        await self.client.rerun()
+        self.client.set("radio", "Rol", "Yetkili Girişi")
+        self.client.set("text_input", "Kullanıcı Adı", self.username)
+        self.client.set("text_input", "Şifre", self.password)
+
+        async def fn():
+            await self.client.rerun(click="Manuel Giriş")
+            if not self.client.has("radio", "Modüller"):
+                raise RuntimeError("giriş başarısız: " + "; ".join(self.client.errors()))
+        return await self._step("login", fn)
+
+    async def resume(self):
+        """Sayfa yenilemesini oynatır: URL'deki oturum jetonuyla yeni bağlantı açılır."""
+        query_string = self.client.query_string
+
+        async def fn():
+            self.client.close()
+            self.client = ServerSession(self.url, self.timeout)
+            self.client.query_string = query_string
+            await self.client.connect()
+            await self.client.rerun()
+            if not self.client.has("radio", "Modüller"):
+                raise RuntimeError("oturum jetonuyla devam edilemedi")
+        return await self._step("resume", fn)
+
+    async def koli_ver(self):
+        async def fn():
+            await self._goto("Koli Ver")
+            self.client.set("text_input", "Harmony Ref *", f"LOAD{random.randrange(self.people):06d}")
+            await self.client.rerun()
+            self.client.set("text_input", "Form Seri No *", f"LOAD-{os.getpid()}-{time.perf_counter_ns()}")
+            self.client.set("number_input", "Koli Sayısı *", random.randint(1, 5))
+            await self.client.rerun(click="Kaydı Oluştur")
+            # Form değerleri yalnızca gönderildikleri rerun'a aittir
+            for label in ("Harmony Ref *", "Form Seri No *"):
+                self.client.values.pop(("text_input", label), None)
+            self.client.values.pop(("number_input", "Koli Sayısı *"), None)
+            # Limit reddi beklenen bir sonuçtur; diğer hata mesajları (ör. zaman aşımı) hatadır
+            failures = [e for e in self.client.errors() if "limit" not in e.lower()]
+            if failures:
+                raise RuntimeError(failures[0])
+            if not self.client.successes() and not self.client.errors():
+                raise RuntimeError((self.client.warnings() or ["kayıt sonucu görünmedi"])[0])
+        return await self._step("koli_ver", fn)
+
+    async def kayitlar(self):
+        return await self._step("kayitlar", lambda: self._goto("Kayıtlar"))
+
+    async def raporlar(self):
+        return await self._step("raporlar", lambda: self._goto("Raporlar"))
+
+    async def play(self, iterations: int, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            if not await self.login() or not await self.resume():
+                return
+            names, weights = zip(*ACTIONS.items())
+            for _ in range(iterations):
+                await getattr(self, random.choices(names, weights)[0])()
+        finally:
+            self.client.close()
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port: int, db_path: Path, timeout: float = 60.0) -> subprocess.Popen:
+    env = dict(os.environ, HKTS_DB_PATH=str(db_path))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(APP), "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"streamlit sunucusu başlamadı (çıkış kodu {proc.returncode})")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("streamlit sunucusu zamanında hazır olmadı")
+
+async def _warm_up(url: str, timeout: float):
+    # İlk çalıştırma modülleri yükler ve bootstrap_db'yi çalıştırır; ölçüme girmez
+    client = ServerSession(url, timeout)
+    await client.connect()
+    await client.rerun()
+    client.close()
+
+async def _run_sessions(url, sessions, iterations, people, username, password, ramp, timeout,
+                        stats, db_path):
+    wal_peak = 0
+    players = [Session(stats, url, username, password, people, timeout).play(iterations, random.uniform(0, ramp))
+               for _ in range(sessions)]
+    task = asyncio.gather(*players)
+    # WAL, son bağlantı kapanınca checkpoint ile sıfırlanır; tepe değeri çalışma sırasında örnekle
+    while not task.done():
+        if db_path is not None:
+            wal_peak = max(wal_peak, _db_sizes(db_path)[1])
+        await asyncio.wait([task], timeout=0.2)
+    task.result()
+    return wal_peak
+
+def run(sessions: int, iterations: int, people: int, username: str, password: str,
+        ramp: float, timeout: float, url=None, db_path=None, seed=None) -> dict:
+    if seed is not None:
+        random.seed(seed)
+    server = None
+    if url is None:
+        port = _free_port()
+        server = start_server(port, db_path)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(_warm_up(url, timeout))
+        stats = Stats()
+        size_before = _db_sizes(db_path) if db_path else (0, 0)
+        t0 = time.time()
+        wal_peak = asyncio.run(_run_sessions(url, sessions, iterations, people, username, password,
+                                             ramp, timeout, stats, db_path))
+        wall = time.time() - t0
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(10)
+    size_after = _db_sizes(db_path) if db_path else (0, 0)
+
+    report = {"sessions": sessions, "iterations": iterations, "wall_s": round(wall, 2),
+              "url": url, "db": str(db_path) if db_path else None, "actions": {}}
+    all_lat = []
+    for action, lat in stats.latency.items():
+        all_lat.extend(lat)
+        n = stats.runs[action]
+        report["actions"][action] = {
+            "n": n,
+            "p50_ms": round(_pct(lat, 50) * 1000, 1),
+            "p90_ms": round(_pct(lat, 90) * 1000, 1),
+            "p99_ms": round(_pct(lat, 99) * 1000, 1),
+            "mean_ms": round(statistics.fmean(lat) * 1000, 1),
+            "error_rate": round(stats.errors[action] / n, 4),
+            "lock_timeout_rate": round(stats.lock_errors[action] / n, 4),
+        }
+    total = sum(stats.runs.values())
+    report["overall"] = {
+        "n": total,
+        "throughput_rps": round(total / wall, 2) if wall else 0.0,
+        "p50_ms": round(_pct(all_lat, 50) * 1000, 1),
+        "p90_ms": round(_pct(all_lat, 90) * 1000, 1),
+        "p99_ms": round(_pct(all_lat, 99) * 1000, 1),
+        "error_rate": round(sum(stats.errors.values()) / total, 4) if total else 0.0,
+        "lock_timeout_rate": round(sum(stats.lock_errors.values()) / total, 4) if total else 0.0,
+    }
+    report["error_samples"] = stats.samples
+    report["db_bytes"] = {"before": size_before[0], "after": size_after[0],
+                          "wal_before": size_before[1], "wal_after": size_after[1],
+                          "wal_peak": wal_peak}
+    return report
+
+def print_report(r: dict):
+    print(f"{r['sessions']} oturum x {r['iterations']} işlem, {r['wall_s']} sn  ({r['url']}, {r['db'] or 'DB bilinmiyor'})")
+    print("ölçüm: gerçek streamlit sunucusu, tek süreç / tek DB yazıcısı; istemciler aynı makinede "
+          "(CPU paylaşılır). login yalnızca kimlik gönderimi + rerun'u kapsar, ısınma hariç.")
+    print(f"{'işlem':<10}{'n':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'hata%':>8}{'kilit%':>8}")
+    for name, a in sorted(r["actions"].items()) + [("TOPLAM", r["overall"])]:
+        print(f"{name:<10}{a['n']:>6}{a['p50_ms']:>9}{a['p90_ms']:>9}{a['p99_ms']:>9}"
+              f"{a['error_rate']*100:>8.2f}{a['lock_timeout_rate']*100:>8.2f}")
+    print(f"throughput: {r['overall']['throughput_rps']} işlem/sn")
+    b = r["db_bytes"]
+    print(f"DB: {b['before']} -> {b['after']} bayt, WAL: {b['wal_before']} -> {b['wal_after']} bayt (tepe {b['wal_peak']})")
+    for sample in r["error_samples"]:
+        print(f"  hata örneği: {sample}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--iterations", type=int, default=10, help="giriş sonrası oturum başına işlem")
+    ap.add_argument("--people", type=int, default=500, help="rastgele seçilecek Harmony Ref sayısı")
+    ap.add_argument("--ramp", type=float, default=2.0, help="oturumların açılacağı süre (sn)")
+    ap.add_argument("--timeout", type=float, default=60.0, help="tek rerun için zaman aşımı (sn)")
+    ap.add_argument("--username", default="admin")
+    ap.add_argument("--password", default="admin123")
+    ap.add_argument("--url", help="çalışan sunucu (verilmezse geçici DB ile yeni sunucu başlatılır)")
+    ap.add_argument("--db", help="kullanılacak / --url sunucusunun veritabanı (boyut ölçümü için)")
+    ap.add_argument("--seed", type=int)
+    ap.add_argument("--json", help="raporu bu dosyaya JSON olarak da yaz")
+    args = ap.parse_args(argv)
+
+    db_path = Path(args.db) if args.db else None
+    if db_path is None and args.url is None:
+        db_path = Path(tempfile.mkdtemp(prefix="hkts_load_")) / "hkts.db"
+
+    report = run(args.sessions, args.iterations, args.people, args.username, args.password,
+                 args.ramp, args.timeout, url=args.url, db_path=db_path, seed=args.seed)
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()